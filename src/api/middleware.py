@@ -19,7 +19,7 @@ class AuthMiddleware:
         self,
         app: Callable,
         exclude_paths: Optional[List[str]] = None,
-        db_engine: Any = None # Add db_engine parameter
+        db_engine: Any = None # Fixed engine; when None, the engine is read from app.state.db_engine on each request
     ):
         self.app = app
         self.exclude_paths = exclude_paths if exclude_paths is not None else []
@@ -59,7 +59,7 @@ class AuthMiddleware:
                 await response(scope, receive, send)
                 return
             
-            session: Session = Session(self.db_engine) # Use the injected db_engine
+            session: Session = Session(self.db_engine or request.app.state.db_engine) # Use the injected or app-level db_engine
             print("AuthMiddleware: Database session created.")
             
             try:
@@ -72,4 +72,11 @@ class BrokerageInterface(ABC):
         Retrieve the current account balance and related details.
         :return: A dictionary containing account balance information, or None if unavailable.
         """
-        pass
\ No newline at end of file
+        pass
+
+    async def aclose(self) -> None:
+        """
+        Release any resources the adapter holds open, such as HTTP connection pools.
+        Must be awaited on the event loop that used the adapter. Adapters holding nothing can keep this no-op.
+        """
+        pass
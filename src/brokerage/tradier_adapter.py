@@ -4,18 +4,29 @@ from src.models.brokerage_connection import BrokerageConnection
 from src.models.broker import Broker # Import Broker model
 from src.utils.redis_utils import redis_client # Import redis_client
 import requests
+import httpx
 import base64
 import urllib.parse
 import json
 from datetime import datetime, timedelta, timezone
 
+# Seconds allowed for connect/read/write/pool on async Tradier requests; set explicitly rather than relying on httpx's 5s default
+_HTTP_TIMEOUT = 30.0
+
 class TradierAdapter(BrokerageInterface):
     """Tradier brokerage adapter implementation."""
 
-    def __init__(self, broker: Broker, connection: BrokerageConnection, _version="v1"):
+    def __init__(self, broker: Broker, connection: BrokerageConnection, _version="v1", transport: Optional[httpx.AsyncBaseTransport] = None):
         self._base_url = broker.base_url
         self._version = _version
         self._connection = connection # Store the connection object
+        # Async endpoints go through httpx so they don't block the event loop; transport is overridable for tests
+        # The client holds a connection pool: call aclose() on the same event loop once the adapter is done
+        self._client = httpx.AsyncClient(transport=transport, timeout=_HTTP_TIMEOUT)
+
+    async def aclose(self) -> None:
+        """Close the async HTTP client and its connection pool."""
+        await self._client.aclose()
 
     def connect(self) -> bool:
         """Establish connection to the Tradier API using decrypted tokens."""
@@ -70,7 +81,7 @@ class TradierAdapter(BrokerageInterface):
             "expiration": expiration
         }
         try:
-            response = requests.get(url, headers=headers, params=params)
+            response = await self._client.get(url, headers=headers, params=params)
             response.raise_for_status()
             option_chain_data = response.json().get('options', {}).get('option', [])
             
@@ -79,7 +90,7 @@ class TradierAdapter(BrokerageInterface):
                 await redis_client.setex(cache_key, 3600, json.dumps(option_chain_data))
             
             return option_chain_data
-        except requests.exceptions.RequestException as e:
+        except (httpx.HTTPError, ValueError) as e: # ValueError: a non-JSON body, e.g. a maintenance page
             print(f"Error fetching option chain for {symbol}: {e}")
             return []
 
@@ -103,10 +114,10 @@ class TradierAdapter(BrokerageInterface):
             data["price"] = price
 
         try:
-            response = requests.post(url, headers=headers, data=data)
+            response = await self._client.post(url, headers=headers, data=data)
             response.raise_for_status()
             return response.json().get('order', {})
-        except requests.exceptions.RequestException as e:
+        except (httpx.HTTPError, ValueError) as e:
             print(f"Error placing order for {symbol}: {e}")
             return {}
 
@@ -142,7 +153,7 @@ class TradierAdapter(BrokerageInterface):
             "symbols": symbols_str
         }
         try:
-            response = requests.get(url, headers=headers, params=params)
+            response = await self._client.get(url, headers=headers, params=params)
             response.raise_for_status()
             quotes_data = response.json().get('quotes', {}).get('quote', [])
             quotes_dict = {quote['symbol']: quote for quote in quotes_data}
@@ -152,7 +163,7 @@ class TradierAdapter(BrokerageInterface):
                 await redis_client.setex(cache_key, 300, json.dumps(quotes_dict))
             
             return quotes_dict
-        except requests.exceptions.RequestException as e:
+        except (httpx.HTTPError, ValueError) as e:
             print(f"Error fetching quotes for {symbols}: {e}")
             return {}
 
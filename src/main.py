@@ -106,6 +106,8 @@ def create_app(db_engine=None):
         # No specific shutdown logic for tables needed here as they are managed by test fixtures
         
     app = FastAPI(title="AlgoTraderPy", lifespan=lifespan)
+    # Engine AuthMiddleware opens its sessions on; kept on app.state so it is resolved per request and can be rebound
+    app.state.db_engine = db_engine or engine
     
     # Add exception handler for HTTPException
     @app.exception_handler(HTTPException)
@@ -124,7 +126,7 @@ def create_app(db_engine=None):
         allow_methods=["*"],  # Allows all methods
         allow_headers=["*"],  # Allows all headers
     )
-    app.add_middleware(AuthMiddleware, exclude_paths=["/api/v1/token", "/api/v1/register", "/api/v1/test"], db_engine=db_engine or engine)
+    app.add_middleware(AuthMiddleware, exclude_paths=["/api/v1/token", "/api/v1/register", "/api/v1/test"])
     
     # Initialize FastAPI-Limiter within the lifespan context
     # The @app.on_event("startup") decorator is deprecated in favor of lifespan
@@ -1,3 +1,4 @@
+from functools import cache
 from typing import List, Optional
 from datetime import datetime, timezone
 from sqlmodel import Field, Relationship, SQLModel, LargeBinary, Column, DateTime
@@ -6,6 +7,11 @@ from src.utils.encryption import EncryptionUtil
 from src.config import settings
 from src.models.broker import Broker # New import
 
+@cache
+def _get_encryption_util(key: str) -> EncryptionUtil:
+    """Return a shared EncryptionUtil per key so the Fernet cipher isn't rebuilt for every connection."""
+    return EncryptionUtil(key=key)
+
 class BrokerageConnection(BaseModel, table=True):
     """
     BrokerageConnection model for storing API credentials and connection details.
@@ -28,6 +34,11 @@ class BrokerageConnection(BaseModel, table=True):
     broker: Optional["Broker"] = Relationship(back_populates="connections") # New relationship
     bot_instances: List["BotInstance"] = Relationship(back_populates="brokerage_connection")
 
+    @property
+    def _encryption_util(self) -> EncryptionUtil:
+        # Resolved from the class-wide cache so rows loaded from the database (which skip __init__) can decrypt too
+        return _get_encryption_util(settings.encryption_key)
+
     def __init__(self, user_id: int, broker_id: int, access_token: Optional[str] = None,
                  refresh_token: Optional[str] = None, expires_at: Optional[datetime] = None,
                  api_key: Optional[str] = None, api_secret: Optional[str] = None,
@@ -41,7 +52,6 @@ class BrokerageConnection(BaseModel, table=True):
             expires_at=expires_at,
             **kwargs
         )
-        self._encryption_util = EncryptionUtil(key=settings.encryption_key)
 
         # Assign and encrypt if provided as string
         self.api_key = self._encryption_util.encrypt(api_key).encode('utf-8') if api_key else None
@@ -49,6 +59,18 @@ class BrokerageConnection(BaseModel, table=True):
         self.access_token = self._encryption_util.encrypt(access_token).encode('utf-8') if access_token else None
         self.refresh_token = self._encryption_util.encrypt(refresh_token).encode('utf-8') if refresh_token else None
 
+    @classmethod
+    def from_encrypted(cls, user_id: int, broker_id: int, api_key: Optional[bytes] = None,
+                       api_secret: Optional[bytes] = None, access_token: Optional[bytes] = None,
+                       refresh_token: Optional[bytes] = None, **kwargs) -> "BrokerageConnection":
+        """Builds a connection from already-encrypted credentials, skipping the encryption done in __init__."""
+        connection = cls(user_id=user_id, broker_id=broker_id, **kwargs)
+        connection.api_key = api_key
+        connection.api_secret = api_secret
+        connection.access_token = access_token
+        connection.refresh_token = refresh_token
+        return connection
+
     def encrypt_field(self, field_name: str, value: Optional[str]):
         """Encrypts a string value and assigns it to the specified field."""
         if value is not None and isinstance(value, str):
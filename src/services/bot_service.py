@@ -95,7 +95,14 @@ class BotService:
 
     def _run_trading_loop_in_thread(self, bot_instance_id: int):
         """Helper to run the async trading loop in a separate thread."""
-        asyncio.run(self._run_trading_loop(bot_instance_id))
+        asyncio.run(self._run_trading_session(bot_instance_id))
+
+    async def _run_trading_session(self, bot_instance_id: int):
+        """Run the trading loop, then close the adapter on the event loop it used; asyncio.run discards that loop afterwards."""
+        try:
+            await self._run_trading_loop(bot_instance_id)
+        finally:
+            await self.brokerage_adapter.aclose()
 
     async def _run_trading_loop(self, bot_instance_id: int):
         # Placeholder for the main trading loop
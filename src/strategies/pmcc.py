@@ -1,9 +1,16 @@
+from functools import lru_cache
 from typing import Dict, List, Optional, Any
-from datetime import datetime, date
+from datetime import date, datetime
 from .base import Strategy
 from src.position_sizing.kelly import calculate_kelly_percentage, calculate_position_size, calculate_fractional_kelly
 from src.config import settings
 
+@lru_cache(maxsize=1024)
+def _expiration_ordinal(expiration_date: str) -> int:
+    """Day ordinal of a YYYY-MM-DD expiration date; a chain only has a handful of distinct expirations, so each is parsed once.
+    strptime rather than date.fromisoformat, which on 3.11+ also accepts forms like 20240621 and 2024-W25-5."""
+    return datetime.strptime(expiration_date, '%Y-%m-%d').toordinal()
+
 class PMCCStrategy(Strategy):
     """Poor Man's Covered Call trading strategy implementation."""
 
@@ -188,6 +195,7 @@ class PMCCStrategy(Strategy):
         Selects the appropriate long call option based on PMCC strategy criteria.
         """
         long_calls = []
+        today = date.today().toordinal()
         for option in option_chain:
             if option.get('optionType') == 'CALL':
                 delta = option.get('greeks', {}).get('delta')
@@ -195,9 +203,7 @@ class PMCCStrategy(Strategy):
                     continue
 
                 try:
-                    expiration_date = datetime.strptime(option.get('expirationDate'), '%Y-%m-%d').date()
-                    today = datetime.now().date()
-                    days_to_expiry = (expiration_date - today).days
+                    days_to_expiry = _expiration_ordinal(option.get('expirationDate')) - today
                 except (ValueError, TypeError):
                     continue
 
@@ -205,8 +211,7 @@ class PMCCStrategy(Strategy):
                    self._min_dte_long <= days_to_expiry <= self._max_dte_long:
                     long_calls.append(option)
 
-        long_calls.sort(key=lambda x: x.get('delta', 0), reverse=True)
-        return long_calls[0] if long_calls else None
+        return max(long_calls, key=lambda x: x.get('delta', 0), default=None)
 
     def _select_short_call(self, option_chain: List[Dict]) -> Optional[Dict]:
         """
@@ -220,6 +225,7 @@ class PMCCStrategy(Strategy):
         otm_daily_calls = self._filter_otm_daily_calls(option_chain, current_price)
 
         short_calls = []
+        today = date.today().toordinal()
         for option in otm_daily_calls: # Iterate over the pre-filtered options
             delta = option.get('greeks', {}).get('delta')
             
@@ -238,9 +244,7 @@ class PMCCStrategy(Strategy):
                 continue
 
             try:
-                expiration_date = datetime.strptime(option.get('expirationDate'), '%Y-%m-%d').date()
-                today = datetime.now().date()
-                days_to_expiry = (expiration_date - today).days
+                days_to_expiry = _expiration_ordinal(option.get('expirationDate')) - today
             except (ValueError, TypeError):
                 continue
 
@@ -250,38 +254,37 @@ class PMCCStrategy(Strategy):
 
         target_mid_delta = (self._min_delta_short + self._max_delta_short) / 2
         
-        short_calls.sort(key=lambda x: (x.get('expirationDate', '9999-12-31'), abs(x.get('greeks', {}).get('delta', 0) - target_mid_delta)))
-        return short_calls[0] if short_calls else None
+        # A single min() pass finds the same first-ranked option as a stable sort would, without sorting the whole list
+        return min(short_calls, key=lambda x: (x.get('expirationDate', '9999-12-31'), abs(x.get('greeks', {}).get('delta', 0) - target_mid_delta)), default=None)
 
     def _filter_otm_daily_calls(self, option_chain: List[Dict], current_price: float) -> List[Dict]:
         """
         Filters the option chain for out-of-the-money (OTM) call options with daily expiry.
         """
+        # Single pass: compare integer day ordinals and keep only the nearest expiry seen so far,
+        # instead of grouping every qualifying option by its expiration string
         otm_daily_calls = []
-        today = datetime.now().date()
-        
-        # Group options by expiration date
-        options_by_expiry = {}
+        nearest_expiry = None
+        today = date.today().toordinal()
+
         for option in option_chain:
             if option.get('optionType') == 'CALL' and option.get('strike') > current_price:
                 try:
-                    expiration_date_str = option.get('expirationDate')
-                    expiration_date = datetime.strptime(expiration_date_str, '%Y-%m-%d').date()
-                    
-                    # Check for daily expiry (e.g., next few days, or specific pattern)
-                    # For MVP, let's consider options expiring within the next 7 days as 'daily'
-                    # This can be refined based on brokerage data for actual 'daily' contracts
-                    if 0 <= (expiration_date - today).days <= 7: # Adjust this range as needed for 'daily'
-                        if expiration_date_str not in options_by_expiry:
-                            options_by_expiry[expiration_date_str] = []
-                        options_by_expiry[expiration_date_str].append(option)
+                    expiry = _expiration_ordinal(option.get('expirationDate'))
                 except (ValueError, TypeError):
                     continue
-        
-        # Find the nearest daily expiry and collect options for that date
-        if options_by_expiry:
-            nearest_expiry_date = min(options_by_expiry.keys())
-            otm_daily_calls = options_by_expiry[nearest_expiry_date]
+
+                # Check for daily expiry (e.g., next few days, or specific pattern)
+                # For MVP, let's consider options expiring within the next 7 days as 'daily'
+                # This can be refined based on brokerage data for actual 'daily' contracts
+                if not 0 <= expiry - today <= 7: # Adjust this range as needed for 'daily'
+                    continue
+
+                if nearest_expiry is None or expiry < nearest_expiry:
+                    nearest_expiry = expiry
+                    otm_daily_calls = [option]
+                elif expiry == nearest_expiry:
+                    otm_daily_calls.append(option)
         return otm_daily_calls
  
     def _identify_trade(self, long_call: Dict, short_call: Dict, current_price: float) -> Optional[Dict]:
@@ -312,8 +315,8 @@ class PMCCStrategy(Strategy):
                 return None
 
             try:
-                long_call_expiration = datetime.strptime(long_call_expiration_str, '%Y-%m-%d').date()
-                short_call_expiration = datetime.strptime(short_call_expiration_str, '%Y-%m-%d').date()
+                long_call_expiry = _expiration_ordinal(long_call_expiration_str)
+                short_call_expiry = _expiration_ordinal(short_call_expiration_str)
             except (ValueError, TypeError):
                 return None
 
@@ -323,8 +326,8 @@ class PMCCStrategy(Strategy):
                 return None
  
             # Validation 2: Short call expiration must be earlier than long call expiration
-            if short_call_expiration >= long_call_expiration:
-                print(f"Validation Failed: Short call expiration ({short_call_expiration}) >= Long call expiration ({long_call_expiration})")
+            if short_call_expiry >= long_call_expiry: # Day ordinals compare like the dates they encode
+                print(f"Validation Failed: Short call expiration ({short_call_expiration_str}) >= Long call expiration ({long_call_expiration_str})")
                 return None
  
             net_debit = (long_call_price - short_call_price) * 100
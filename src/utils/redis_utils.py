@@ -8,6 +8,10 @@ redis_client: Optional[redis.Redis] = None
 
 import asyncio
 
+def _now() -> datetime:
+    """Current UTC time; a seam so tests can pin the clock used for blacklist TTLs."""
+    return datetime.now(timezone.utc)
+
 async def initialize_redis(retries: int = 5, delay: int = 2) -> redis.Redis:
     """
     Initializes the global Redis client and returns it.
@@ -37,7 +41,7 @@ async def close_redis_connection():
 async def add_jti_to_blacklist(jti: str, expires_at: datetime):
     """Adds a JTI to the Redis blacklist."""
     if redis_client:
-        ttl = (expires_at - datetime.now(timezone.utc)).total_seconds()
+        ttl = (expires_at - _now()).total_seconds()
         if ttl > 0:
             await redis_client.setex(f"blacklist:{jti}", int(ttl), "blacklisted")
             logger.info(f"JTI {jti} added to blacklist with TTL {int(ttl)}s.")
@@ -1,9 +1,6 @@
-import sys
 import os
-from pathlib import Path
+from contextlib import contextmanager
 from unittest.mock import patch
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-sys.path.insert(0, str(Path(__file__).parent.parent))
 
 os.environ["JWT_SECRET_KEY"] = "test_secret_key"
 os.environ["JWT_ALGORITHM"] = "HS256"
@@ -15,12 +12,16 @@ from fastapi import Request # Import Request
 from fastapi.responses import JSONResponse, Response # Import JSONResponse and Response
 from fastapi.testclient import TestClient
 from src.models.session import Session as SessionModel # Explicitly import SessionModel
+from src.models.user import User, pwd_context
 from sqlmodel import create_engine, Session, SQLModel
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
 from src.main import create_app
 from src.database import get_session
 from dotenv import load_dotenv
 import src.models # Import all models to ensure they are registered with SQLModel.metadata
 import asyncio
+import httpx
 from fastapi_limiter import FastAPILimiter
 from fastapi_limiter.depends import RateLimiter
 from src.utils.redis_utils import redis_client, initialize_redis, close_redis_connection
@@ -31,29 +32,76 @@ if os.path.exists(".env.test"):
 else:
     load_dotenv()
 
+@pytest.fixture(scope="session", autouse=True)
+def fast_password_hashing():
+    # bcrypt at 4 rounds is ~256x cheaper than the default 12; update in place so every importer of pwd_context sees it
+    original_policy = pwd_context.to_dict()
+    pwd_context.update(bcrypt__rounds=4)
+    yield
+    pwd_context.load(original_policy) # Restore the context's own policy rather than assuming its defaults
+
+@pytest.fixture(scope="session")
+def engine():
+    # In-memory SQLite on a single shared connection: no fsync per commit, and each xdist worker gets its own database
+    engine = create_engine("sqlite+pysqlite:///:memory:", echo=False, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None # Let SQLAlchemy emit BEGIN so SAVEPOINTs nest correctly with pysqlite
+        # The database is throwaway, so drop the durability work SQLite does on every commit
+        # page_size only takes effect before the first write, which is why this runs on connect ahead of create_all
+        for pragma in ("page_size=8192", "cache_size=-65536", "synchronous=OFF", "journal_mode=MEMORY", "locking_mode=EXCLUSIVE", "temp_store=MEMORY"):
+            dbapi_connection.execute(f"PRAGMA {pragma}")
+
+    @event.listens_for(engine, "begin")
+    def do_begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+    SQLModel.metadata.create_all(engine) # Create tables once for the whole test session
+    yield engine
+    engine.dispose()
+
 @pytest.fixture(name="session")
-def session_fixture():
-    engine = create_engine("sqlite:///./test.db", echo=False, connect_args={"check_same_thread": False})
-    SQLModel.metadata.create_all(engine) # Create tables for the test database
-    with Session(engine) as session:
+def session_fixture(engine):
+    # Each test runs inside an outer transaction that is rolled back on teardown;
+    # session.commit() only releases a SAVEPOINT, so nothing leaks into the next test
+    # expire_on_commit=False keeps committed attributes loaded instead of re-SELECTing them on access
+    connection = engine.connect()
+    transaction = connection.begin()
+    with Session(bind=connection, join_transaction_mode="create_savepoint", expire_on_commit=False) as session:
         yield session
-    SQLModel.metadata.drop_all(engine) # Drop tables after tests
+    transaction.rollback()
+    connection.close()
 
-@pytest_asyncio.fixture(name="client")
-async def client_fixture(session: Session):
+@pytest.fixture
+def make_user(session: Session):
+    """Factory that inserts a User with flush() only, leaving commits to the test's own transaction."""
+    def _make_user(username: str, **kwargs) -> User:
+        user = User(
+            username=username,
+            email=kwargs.pop("email", f"{username}@example.com"),
+            hashed_password=kwargs.pop("hashed_password", "hashed_password"),
+            **kwargs
+        )
+        session.add(user)
+        session.flush()
+        return user
+    return _make_user
+
+@pytest.fixture(scope="session")
+def app(engine):
+    """The FastAPI app, built once per test session; each test binds it to its own connection with _bind_app."""
+    return create_app(db_engine=engine)
+
+@contextmanager
+def _bind_app(app, session: Session):
+    """Point the shared app's database access at the test's connection and patch FastAPILimiter out, for one test."""
     test_engine = session.bind
 
     def get_session_override():
-        with Session(test_engine) as session:
+        with Session(bind=test_engine, join_transaction_mode="create_savepoint") as session:
             yield session
     
-    app = create_app(db_engine=test_engine)
-    app.dependency_overrides[get_session] = get_session_override
-    
-    # Create a mock Redis client for FastAPILimiter.redis
-    mock_redis_client_for_limiter = AsyncMock()
-    mock_redis_client_for_limiter.script_load.return_value = "mock_sha"
-
     # Create a mock Redis client for FastAPILimiter.redis
     mock_redis_client_for_limiter = AsyncMock()
     mock_redis_client_for_limiter.script_load.return_value = "mock_sha"
@@ -66,9 +114,64 @@ async def client_fixture(session: Session):
         # Return a dummy successful response to bypass rate limiting in tests
         return None
 
-    # Patch FastAPILimiter.redis, FastAPILimiter.init, FastAPILimiter.identifier, and FastAPILimiter.http_callback
-    with patch("fastapi_limiter.FastAPILimiter.redis", new=mock_redis_client_for_limiter), \
-         patch("fastapi_limiter.FastAPILimiter.init", new_callable=AsyncMock), \
-         patch("fastapi_limiter.FastAPILimiter.identifier", new=mock_identifier), \
-         patch("fastapi_limiter.FastAPILimiter.http_callback", new=mock_http_callback):
-        yield TestClient(app)
+    app_engine = app.state.db_engine
+    app.dependency_overrides[get_session] = get_session_override
+    app.state.db_engine = test_engine # AuthMiddleware resolves its engine from app.state on each request
+    try:
+        # Patch FastAPILimiter.redis, FastAPILimiter.init, FastAPILimiter.identifier, and FastAPILimiter.http_callback
+        with patch("fastapi_limiter.FastAPILimiter.redis", new=mock_redis_client_for_limiter), \
+             patch("fastapi_limiter.FastAPILimiter.init", new_callable=AsyncMock), \
+             patch("fastapi_limiter.FastAPILimiter.identifier", new=mock_identifier), \
+             patch("fastapi_limiter.FastAPILimiter.http_callback", new=mock_http_callback):
+            yield app
+    finally:
+        app.dependency_overrides.clear()
+        app.state.db_engine = app_engine
+
+@pytest.fixture(scope="session")
+def shared_client(app):
+    return TestClient(app)
+
+@pytest_asyncio.fixture(name="client")
+async def client_fixture(app, shared_client: TestClient, session: Session):
+    headers = shared_client.headers.copy()
+    with _bind_app(app, session):
+        yield shared_client
+    # The client is shared, so undo any default headers or cookies a test left on it
+    shared_client.headers = headers
+    shared_client.cookies.clear()
+
+@pytest_asyncio.fixture(name="async_client")
+async def async_client_fixture(app, session: Session):
+    # Drives the ASGI app directly on the test's event loop, without TestClient's per-request thread hand-off
+    # follow_redirects matches TestClient, so trailing-slash redirects resolve the same way
+    with _bind_app(app, session):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver", follow_redirects=True) as client:
+            yield client
+
+class MockTradierAPI:
+    """Answers every request sent through its httpx transport with a canned payload and records it.
+    A dict payload is sent as JSON; a str payload is sent as a raw non-JSON body."""
+    def __init__(self):
+        self.transport = httpx.MockTransport(self._handle)
+        self.reset()
+
+    def reset(self):
+        self.calls = []
+        self.json = {}
+
+    def _handle(self, request: httpx.Request) -> httpx.Response:
+        self.calls.append(request)
+        if isinstance(self.json, str):
+            return httpx.Response(200, text=self.json)
+        return httpx.Response(200, json=self.json)
+
+@pytest.fixture(name="tradier_api_module", scope="module")
+def tradier_api_module_fixture():
+    # One transport per module, so module-scoped adapters can be built on top of it
+    return MockTradierAPI()
+
+@pytest.fixture(name="tradier_api")
+def tradier_api_fixture(tradier_api_module):
+    tradier_api_module.reset() # Start each test with no recorded calls and an empty payload
+    return tradier_api_module
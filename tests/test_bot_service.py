@@ -8,26 +8,78 @@ from src.models.brokerage_connection import BrokerageConnection
 from src.models.broker import Broker # Import Broker model
 import threading
 import time
-import asyncio # Import asyncio for running async mocks
+import pytest
+from types import SimpleNamespace
+
+class FakeEvent:
+    """In-process stand-in for threading.Event: a plain flag, no OS lock or condition behind it."""
+    __slots__ = ('_set',)
+
+    def __init__(self):
+        self._set = False
+
+    def set(self):
+        self._set = True
+
+    def clear(self):
+        self._set = False
+
+    def is_set(self):
+        return self._set
+
+@pytest.fixture(autouse=True)
+def patched(monkeypatch):
+    """Patch threading.Thread, threading.Event and the TradierAdapter that BotService imports."""
+    thread = MagicMock()
+    adapter = MagicMock()
+    monkeypatch.setattr('threading.Thread', thread)
+    monkeypatch.setattr('threading.Event', FakeEvent)
+    monkeypatch.setattr('src.services.bot_service.TradierAdapter', adapter)
+    return SimpleNamespace(thread=thread, adapter=adapter)
+
+# Fixed timestamps; the exact time is irrelevant to these tests
+_NOW = datetime(2024, 1, 1, tzinfo=timezone.utc)
+_EXPIRES = _NOW + timedelta(hours=1)
+
+# Attribute-name specs computed once; spec=<class> re-runs dir() on every mock. BrokerageInterface keeps its
+# class spec so its async methods are still mocked as AsyncMocks.
+_SESSION_SPEC = dir(Session)
+_CONNECTION_SPEC = dir(BrokerageConnection)
+_BROKER_SPEC = dir(Broker)
+
+def make_status(status: str, **overrides) -> BotStatus:
+    """Build a fresh BotStatus; BotService mutates the status it is handed, so tests never share one."""
+    return BotStatus(**{"id": 1, "bot_instance_id": 1, "status": status, "last_check_in": _NOW, **overrides})
+
+@pytest.fixture
+def mock_session():
+    return MagicMock(spec=_SESSION_SPEC)
+
+# One get_quotes AsyncMock shared by every bot_service; the fixture clears it before each test
+_QUOTES = AsyncMock(return_value={"SPY": {"last": 400}})
+
+@pytest.fixture
+def bot_service(mock_session):
+    mock_brokerage_adapter = MagicMock(spec=BrokerageInterface)
+    _QUOTES.reset_mock(side_effect=True) # Drop calls and any side_effect left by a previous test
+    mock_brokerage_adapter.get_quotes = _QUOTES
+    return BotService(mock_session, brokerage_adapter=mock_brokerage_adapter)
 
-def test_get_bot_status_existing():
+def test_get_bot_status_existing(mock_session, bot_service):
     """Test retrieving an existing bot status."""
-    mock_session = MagicMock(spec=Session)
-    existing_status = BotStatus(id=1, bot_instance_id=1, status="active", last_check_in=datetime.now(timezone.utc))
+    existing_status = make_status("active")
     mock_session.exec.return_value.first.return_value = existing_status
 
-    service = BotService(mock_session, brokerage_adapter=MagicMock(spec=BrokerageInterface))
-    status = service.get_bot_status(1)
+    status = bot_service.get_bot_status(1)
 
     assert status == existing_status
     mock_session.exec.assert_called_once()
     mock_session.add.assert_not_called()
     mock_session.commit.assert_not_called()
 
-def test_get_bot_status_returns_most_recent():
+def test_get_bot_status_returns_most_recent(mock_session, bot_service):
     """Test that get_bot_status returns the most recent status."""
-    mock_session = MagicMock(spec=Session)
-    
+
     # Create older and newer status entries
     older_status = BotStatus(id=1, bot_instance_id=1, status="inactive", last_check_in=datetime(2023, 1, 1, 10, 0, 0, tzinfo=timezone.utc))
     newer_status = BotStatus(id=2, bot_instance_id=1, status="active", last_check_in=datetime(2023, 1, 1, 11, 0, 0, tzinfo=timezone.utc))
@@ -35,22 +87,19 @@ def test_get_bot_status_returns_most_recent():
     # Mock the exec call to return results in a specific order (newer first due to order_by)
     mock_session.exec.return_value.first.return_value = newer_status
 
-    service = BotService(mock_session, brokerage_adapter=MagicMock(spec=BrokerageInterface))
-    status = service.get_bot_status(1)
+    status = bot_service.get_bot_status(1)
 
     assert status == newer_status
     mock_session.exec.assert_called_once()
     # Verify that the query included order_by
-    args, kwargs = mock_session.exec.call_args
-    assert "ORDER BY" in str(args[0]).upper() # Check if ORDER BY is in the query string representation (case-insensitive)
+    stmt = mock_session.exec.call_args.args[0]
+    assert stmt._order_by_clauses, "expected ORDER BY" # Inspect the statement instead of compiling it to SQL
 
-def test_get_bot_status_new():
+def test_get_bot_status_new(mock_session, bot_service):
     """Test creating a new bot status if none exists."""
-    mock_session = MagicMock(spec=Session)
     mock_session.exec.return_value.first.return_value = None
 
-    service = BotService(mock_session, brokerage_adapter=MagicMock(spec=BrokerageInterface))
-    status = service.get_bot_status(1)
+    status = bot_service.get_bot_status(1)
 
     assert status.bot_instance_id == 1
     assert status.status == "inactive"
@@ -59,242 +108,158 @@ def test_get_bot_status_new():
     mock_session.commit.assert_called_once()
     mock_session.refresh.assert_called_once_with(status)
 
-@patch('threading.Thread')
-@patch('threading.Event')
-@patch('src.services.bot_service.TradierAdapter') # Patch the TradierAdapter class where BotService imports it
-def test_start_bot_inactive(mock_tradier_adapter, mock_event, mock_thread):
-    """Test starting an inactive bot."""
-    mock_session = MagicMock(spec=Session)
+@pytest.mark.parametrize("initial,connect,expected_result,final", [
+    ("inactive", True, {"message": "Bot started successfully."}, "active"),
+    ("active", None, {"message": "Bot is already running."}, "active"),
+    ("inactive", False, {"message": "Failed to start bot: Could not connect to brokerage.", "status": "error"}, "error"),
+], ids=["inactive", "active", "connection_failure"])
+def test_start_bot(patched, mock_session, bot_service, initial, connect, expected_result, final):
+    """Test starting a bot that is inactive, already active, or fails to connect to the brokerage."""
     # Configure the mock TradierAdapter instance that BotService will create
-    mock_tradier_adapter.return_value.connect.return_value = True
-    mock_connection_details = MagicMock(spec=BrokerageConnection)
+    patched.adapter.return_value.connect.return_value = connect
+    mock_connection_details = MagicMock(spec=_CONNECTION_SPEC)
     mock_connection_details.broker_id = 1 # Mock broker_id for lookup
-    mock_connection_details.expires_at = datetime.now(timezone.utc) + timedelta(hours=1) # Mock expires_at
+    mock_connection_details.expires_at = _EXPIRES # Mock expires_at
     mock_connection_details.api_key = "mock_api_key"
     mock_connection_details.api_secret = "mock_api_secret"
     mock_connection_details.decrypt_access_token.return_value = "mock_access_token" # Ensure access token is present for connect
 
-    mock_broker = MagicMock(spec=Broker)
+    mock_broker = MagicMock(spec=_BROKER_SPEC)
     mock_broker.id = 1
     mock_broker.base_url = "https://mock-tradier-api.com"
-    mock_session.exec.return_value.first.return_value = mock_broker # Mock the broker lookup
 
-    existing_status = BotStatus(id=1, bot_instance_id=1, status="inactive", last_check_in=datetime.now(timezone.utc))
-    
-    # Mock the session.exec calls for both Broker and BotStatus
-    # Configure side_effect for mock_session.exec.return_value.first
-    # The first call to .first() (from get_bot_status) should return existing_status
-    # The second call should return mock_broker (for the broker lookup)
-    # Subsequent calls to get_bot_status should return existing_status
-    mock_session.exec.return_value.first.side_effect = [existing_status, mock_broker, existing_status, existing_status, existing_status]
-
-    service = BotService(mock_session) # No need to pass mock_brokerage_adapter here
-    result = service.start_bot(1, mock_connection_details)
- 
-    assert result == {"message": "Bot started successfully."}
-    assert existing_status.status == "active"
-    mock_session.add.assert_called_once_with(existing_status)
-    mock_session.commit.assert_called_once()
-    mock_session.refresh.assert_called_once_with(existing_status)
-    # Assert that the connect method on the *mocked instance* was called
-    mock_tradier_adapter.return_value.connect.assert_called_once()
-    mock_event.return_value.clear.assert_called_once()
-    mock_thread.assert_called_once_with(target=service._run_trading_loop_in_thread, args=(1,)) # Changed target
-    mock_thread.return_value.start.assert_called_once()
-
-@patch('threading.Thread')
-@patch('threading.Event')
-@patch('src.services.bot_service.TradierAdapter') # Patch the TradierAdapter class where BotService imports it
-def test_start_bot_active(mock_tradier_adapter, mock_event, mock_thread):
-    """Test starting an already active bot."""
-    mock_session = MagicMock(spec=Session)
-    # No need to configure mock_tradier_adapter.return_value.connect as it shouldn't be called
-    mock_connection_details = MagicMock(spec=BrokerageConnection)
-    mock_connection_details.broker_id = 1 # Mock broker_id for lookup
-    mock_connection_details.expires_at = datetime.now(timezone.utc) + timedelta(hours=1) # Mock expires_at
-    mock_connection_details.api_key = "mock_api_key"
-    mock_connection_details.api_secret = "mock_api_secret"
-    mock_connection_details.decrypt_access_token.return_value = "mock_access_token" # Ensure access token is present for connect
+    existing_status = make_status(initial)
 
-    mock_broker = MagicMock(spec=Broker)
-    mock_broker.id = 1
-    mock_broker.base_url = "https://mock-tradier-api.com"
-    mock_session.exec.return_value.first.return_value = mock_broker # Mock the broker lookup
-
-    existing_status = BotStatus(id=1, bot_instance_id=1, status="active", last_check_in=datetime.now(timezone.utc))
-    
-    # Mock the session.exec calls for both Broker and BotStatus
-    mock_session.exec.return_value.first.side_effect = [existing_status, mock_broker, existing_status, existing_status]
-
-    service = BotService(mock_session) # No need to pass mock_brokerage_adapter here
-    result = service.start_bot(1, mock_connection_details)
- 
-    assert result == {"message": "Bot is already running."}
-    assert existing_status.status == "active" # Should remain active
-    mock_session.add.assert_not_called()
-    mock_session.commit.assert_not_called()
-    # Assert that the TradierAdapter class was not instantiated
-    mock_tradier_adapter.assert_not_called()
-    mock_event.return_value.clear.assert_not_called()
-    mock_thread.return_value.start.assert_not_called()
-
-@patch('threading.Thread')
-@patch('threading.Event')
-@patch('src.services.bot_service.TradierAdapter') # Patch the TradierAdapter class where BotService imports it
-def test_start_bot_connection_failure(mock_tradier_adapter, mock_event, mock_thread):
-    """Test starting a bot when brokerage connection fails."""
-    mock_session = MagicMock(spec=Session)
-    # Configure the mock TradierAdapter instance that BotService will create
-    mock_tradier_adapter.return_value.connect.return_value = False # Simulate connection failure
-    mock_connection_details = MagicMock(spec=BrokerageConnection)
-    mock_connection_details.broker_id = 1 # Mock broker_id for lookup
-    mock_connection_details.expires_at = datetime.now(timezone.utc) + timedelta(hours=1) # Mock expires_at
-    mock_connection_details.api_key = "mock_api_key"
-    mock_connection_details.api_secret = "mock_api_secret"
-    mock_connection_details.decrypt_access_token.return_value = "mock_access_token" # Ensure access token is present for connect
-
-    mock_broker = MagicMock(spec=Broker)
-    mock_broker.id = 1
-    mock_broker.base_url = "https://mock-tradier-api.com"
-    mock_session.exec.return_value.first.return_value = mock_broker # Mock the broker lookup
-
-    existing_status = BotStatus(id=1, bot_instance_id=1, status="inactive", last_check_in=datetime.now(timezone.utc))
-    
-    # Mock the session.exec calls for both Broker and BotStatus
-    mock_session.exec.return_value.first.side_effect = [existing_status, mock_broker, existing_status, existing_status]
-
-    service = BotService(mock_session) # No need to pass mock_brokerage_adapter here
-    result = service.start_bot(1, mock_connection_details)
- 
-    assert result == {"message": "Failed to start bot: Could not connect to brokerage.", "status": "error"}
-    assert existing_status.status == "error" # Status should be set to error
-    assert existing_status.error_message == "Failed to connect to brokerage."
-    mock_session.add.assert_called_once_with(existing_status)
-    mock_session.commit.assert_called_once()
-    mock_session.refresh.assert_called_once_with(existing_status)
-    # Assert that the connect method on the *mocked instance* was called
-    mock_tradier_adapter.return_value.connect.assert_called_once()
-    mock_event.return_value.clear.assert_not_called()
-    mock_thread.return_value.start.assert_not_called()
+    # The first call to .first() (from get_bot_status) returns existing_status, the second the broker lookup,
+    # and any later get_bot_status calls (e.g. from handle_bot_error) return existing_status again
+    mock_session.exec.return_value.first.side_effect = [existing_status, mock_broker, existing_status, existing_status, existing_status]
 
-@patch('threading.Event')
-def test_stop_bot_active(mock_event):
+    bot_service._stop_trading_event.set() # Left set by a previous stop; a successful start must clear it
+    result = bot_service.start_bot(1, mock_connection_details)
+
+    assert result == expected_result
+    assert existing_status.status == final
+    if initial == "active":
+        # Already running: nothing is persisted and the TradierAdapter class is never instantiated
+        mock_session.add.assert_not_called()
+        mock_session.commit.assert_not_called()
+        patched.adapter.assert_not_called()
+    else:
+        mock_session.add.assert_called_once_with(existing_status)
+        mock_session.commit.assert_called_once()
+        mock_session.refresh.assert_called_once_with(existing_status)
+        # Assert that the connect method on the *mocked instance* was called
+        patched.adapter.return_value.connect.assert_called_once()
+    if connect:
+        assert not bot_service._stop_trading_event.is_set()
+        patched.thread.assert_called_once_with(target=bot_service._run_trading_loop_in_thread, args=(1,))
+        patched.thread.return_value.start.assert_called_once()
+    else:
+        assert bot_service._stop_trading_event.is_set()
+        patched.thread.return_value.start.assert_not_called()
+    if final == "error":
+        assert existing_status.error_message == "Failed to connect to brokerage."
+
+def test_stop_bot_active(patched, mock_session, bot_service):
     """Test stopping an active bot."""
-    mock_session = MagicMock(spec=Session)
-    mock_brokerage_adapter = MagicMock(spec=BrokerageInterface)
-
-    existing_status = BotStatus(id=1, bot_instance_id=1, status="active", last_check_in=datetime.now(timezone.utc))
+    existing_status = make_status("active")
     mock_session.exec.return_value.first.return_value = existing_status
  
-    service = BotService(mock_session, brokerage_adapter=mock_brokerage_adapter)
     # Simulate a running thread
-    service._trading_thread = MagicMock()
-    service._trading_thread.is_alive.return_value = True
+    bot_service._trading_thread = MagicMock()
+    bot_service._trading_thread.is_alive.return_value = True
 
-    result = service.stop_bot(1)
+    result = bot_service.stop_bot(1)
  
     assert result == {"message": "Bot stopped successfully."}
     assert existing_status.status == "inactive"
     mock_session.add.assert_called_once_with(existing_status)
     mock_session.commit.assert_called_once()
     mock_session.refresh.assert_called_once_with(existing_status)
-    mock_event.return_value.set.assert_called_once()
-    service._trading_thread.join.assert_called_once_with(timeout=5)
+    assert bot_service._stop_trading_event.is_set()
+    bot_service._trading_thread.join.assert_called_once_with(timeout=5)
 
-@patch('threading.Event')
-def test_stop_bot_inactive(mock_event):
+def test_stop_bot_inactive(patched, mock_session, bot_service):
     """Test stopping an already inactive bot."""
-    mock_session = MagicMock(spec=Session)
-    mock_brokerage_adapter = MagicMock(spec=BrokerageInterface)
-
-    existing_status = BotStatus(id=1, bot_instance_id=1, status="inactive", last_check_in=datetime.now(timezone.utc))
+    existing_status = make_status("inactive")
     mock_session.exec.return_value.first.return_value = existing_status
  
-    service = BotService(mock_session, brokerage_adapter=mock_brokerage_adapter)
-    result = service.stop_bot(1)
+    result = bot_service.stop_bot(1)
  
     assert result == {"message": "Bot is already stopped."}
     assert existing_status.status == "inactive" # Should remain inactive
     mock_session.add.assert_not_called()
     mock_session.commit.assert_not_called()
-    mock_event.return_value.set.assert_not_called()
+    assert not bot_service._stop_trading_event.is_set()
     # Ensure join is not called if thread is not alive or not set
-    if service._trading_thread:
-        service._trading_thread.join.assert_not_called()
+    if bot_service._trading_thread:
+        bot_service._trading_thread.join.assert_not_called()
 
-@patch('threading.Event')
-@patch('asyncio.sleep') # Patch asyncio.sleep
+@pytest.mark.asyncio(loop_scope="session")
+@patch('src.services.bot_service.asyncio.sleep', new_callable=AsyncMock) # Awaitable no-op sleep
 @patch.object(BotService, 'get_bot_status') # Patch get_bot_status as a regular mock
-def test_run_trading_loop_stops_on_event(mock_get_bot_status, mock_sleep, mock_event):
+async def test_run_trading_loop_stops_on_event(mock_get_bot_status, mock_sleep, patched, bot_service):
     """Test that _run_trading_loop stops when the event is set."""
-    mock_session = MagicMock(spec=Session)
-    mock_brokerage_adapter = MagicMock(spec=BrokerageInterface)
-    mock_brokerage_adapter.get_quotes = AsyncMock(return_value={"SPY": {"last": 400}}) # Mock as AsyncMock
-
-    service = BotService(mock_session, brokerage_adapter=mock_brokerage_adapter)
-    
     # Simulate the event being set after one iteration
-    mock_event.return_value.is_set.side_effect = [False, True]
+    stop_event = MagicMock()
+    stop_event.is_set.side_effect = [False, True]
     
     # Mock get_bot_status to return active status initially
-    active_status = BotStatus(bot_instance_id=1, status="active", last_check_in=datetime.now(timezone.utc))
+    active_status = make_status("active", id=None)
     mock_get_bot_status.return_value = active_status # Use the patched mock
 
-    service._stop_trading_event = mock_event.return_value # Assign the mocked event
+    bot_service._stop_trading_event = stop_event # Assign the mocked event
 
-    asyncio.run(service._run_trading_loop(1)) # Run the async function
+    await bot_service._run_trading_loop(1)
 
-    mock_brokerage_adapter.get_quotes.assert_called_once_with(["SPY"])
-    # Removed assertions on get_bot_status and sleep call count due to brittle threading mock interactions.
+    bot_service.brokerage_adapter.get_quotes.assert_called_once_with(["SPY"])
     # The test implicitly verifies loop termination by completing without a timeout.
 
-@patch('threading.Event')
-@patch('asyncio.sleep') # Patch asyncio.sleep
+@pytest.mark.asyncio(loop_scope="session")
+@patch('src.services.bot_service.asyncio.sleep', new_callable=AsyncMock) # Awaitable no-op sleep
 @patch.object(BotService, 'get_bot_status') # Patch get_bot_status as a regular mock
-def test_run_trading_loop_stops_on_inactive_status(mock_get_bot_status, mock_sleep, mock_event):
+async def test_run_trading_loop_stops_on_inactive_status(mock_get_bot_status, mock_sleep, patched, bot_service):
     """Test that _run_trading_loop stops when bot status becomes inactive."""
-    mock_session = MagicMock(spec=Session)
-    mock_brokerage_adapter = MagicMock(spec=BrokerageInterface)
-    mock_brokerage_adapter.get_quotes = AsyncMock(return_value={"SPY": {"last": 400}}) # Mock as AsyncMock
-
-    service = BotService(mock_session, brokerage_adapter=mock_brokerage_adapter)
-    
     # Simulate bot status becoming inactive after one iteration
-    active_status = BotStatus(bot_instance_id=1, status="active", last_check_in=datetime.now(timezone.utc))
-    inactive_status = BotStatus(bot_instance_id=1, status="inactive", last_check_in=datetime.now(timezone.utc))
+    active_status = make_status("active", id=None)
+    inactive_status = make_status("inactive", id=None)
     mock_get_bot_status.side_effect = [active_status, inactive_status] # Use the patched mock
 
-    service._stop_trading_event = mock_event.return_value # Assign the mocked event
-    mock_event.return_value.is_set.return_value = False # Keep loop running based on event
 
-    asyncio.run(service._run_trading_loop(1)) # Run the async function
+    await bot_service._run_trading_loop(1)
 
     assert mock_get_bot_status.call_count == 2 # Called once to check, once to find inactive
-    mock_event.return_value.set.assert_called_once() # Should set stop event
-    mock_brokerage_adapter.get_quotes.assert_called_once_with(["SPY"])
+    assert bot_service._stop_trading_event.is_set() # Should set stop event
+    bot_service.brokerage_adapter.get_quotes.assert_called_once_with(["SPY"])
     mock_sleep.assert_not_called()
 
-@patch('threading.Event')
-@patch('asyncio.sleep') # Patch asyncio.sleep
+@pytest.mark.asyncio(loop_scope="session")
+@patch('src.services.bot_service.asyncio.sleep', new_callable=AsyncMock) # Awaitable no-op sleep
 @patch.object(BotService, 'handle_bot_error') # Patch the method on the class
 @patch.object(BotService, 'get_bot_status') # Patch get_bot_status as a regular mock
-def test_run_trading_loop_handles_exception(mock_get_bot_status, mock_handle_bot_error, mock_sleep, mock_event):
+async def test_run_trading_loop_handles_exception(mock_get_bot_status, mock_handle_bot_error, mock_sleep, patched, bot_service):
     """Test that _run_trading_loop handles exceptions and sets error status."""
-    mock_session = MagicMock(spec=Session)
-    mock_brokerage_adapter = MagicMock(spec=BrokerageInterface)
-    mock_brokerage_adapter.get_quotes = AsyncMock(side_effect=Exception("Test API Error")) # Mock as AsyncMock
+    bot_service.brokerage_adapter.get_quotes.side_effect = Exception("Test API Error")
 
-    service = BotService(mock_session, brokerage_adapter=mock_brokerage_adapter)
-    
-    active_status = BotStatus(bot_instance_id=1, status="active", last_check_in=datetime.now(timezone.utc))
+    active_status = make_status("active", id=None)
     mock_get_bot_status.return_value = active_status # Use the patched mock
 
-    service._stop_trading_event = mock_event.return_value # Assign the mocked event
-    mock_event.return_value.is_set.return_value = False # Keep loop running based on event
 
-    asyncio.run(service._run_trading_loop(1)) # Run the async function
+    await bot_service._run_trading_loop(1)
 
-    mock_brokerage_adapter.get_quotes.assert_called_once_with(["SPY"])
+    bot_service.brokerage_adapter.get_quotes.assert_called_once_with(["SPY"])
     mock_handle_bot_error.assert_called_once_with(1, "Trading loop error: Test API Error") # Use the patched mock
-    mock_event.return_value.set.assert_called_once() # Should set stop event
-    mock_sleep.assert_not_called() # Sleep should not be called after error
\ No newline at end of file
+    assert bot_service._stop_trading_event.is_set() # Should set stop event
+    mock_sleep.assert_not_called() # Sleep should not be called after error
+
+@pytest.mark.asyncio(loop_scope="session")
+@patch.object(BotService, '_run_trading_loop', new_callable=AsyncMock)
+async def test_run_trading_session_closes_adapter(mock_run_trading_loop, bot_service):
+    """The adapter is closed on the loop's event loop once the trading loop exits, even if it raised."""
+    mock_run_trading_loop.side_effect = Exception("Loop crashed")
+
+    with pytest.raises(Exception, match="Loop crashed"):
+        await bot_service._run_trading_session(1)
+
+    mock_run_trading_loop.assert_awaited_once_with(1)
+    bot_service.brokerage_adapter.aclose.assert_awaited_once()
@@ -2,6 +2,7 @@ from src.models.broker import Broker
 from src.models.brokerage_connection import BrokerageConnection
 from src.models.user import User
 import pytest
+from sqlalchemy.exc import IntegrityError
 
 def test_create_broker(session):
     broker = Broker(name="TestBroker", base_url="http://test.com", streaming_url="ws://test.com/stream", is_live_mode=False)
@@ -21,30 +22,22 @@ def test_broker_name_unique(session):
     session.commit()
     session.refresh(broker1)
 
-    with pytest.raises(Exception): # Expecting an integrity error or similar
-        broker2 = Broker(name="UniqueBroker", base_url="http://another.com", streaming_url="ws://another.com/stream", is_live_mode=True)
-        session.add(broker2)
-        session.commit() # This should fail due to unique constraint
+    broker2 = Broker(name="UniqueBroker", base_url="http://another.com", streaming_url="ws://another.com/stream", is_live_mode=True)
+    with pytest.raises(IntegrityError): # Unique constraint on name
+        with session.begin_nested(): # SAVEPOINT, so only the duplicate insert is rolled back
+            session.add(broker2)
 
 def test_broker_brokerage_connection_relationship(session):
-    user = User(username="testuser_rel", email="test_rel@example.com", hashed_password="hashedpassword")
-    session.add(user)
-    session.commit()
-    session.refresh(user)
-
-    broker = Broker(name="RelationalBroker", base_url="http://relational.com", streaming_url="ws://relational.com/stream", is_live_mode=True)
-    session.add(broker)
-    session.commit()
-    session.refresh(broker)
-
+    # Pre-assigned ids let the foreign keys be wired up front, so everything goes in with a single commit
+    user = User(id=1, username="testuser_rel", email="test_rel@example.com", hashed_password="hashedpassword")
+    broker = Broker(id=1, name="RelationalBroker", base_url="http://relational.com", streaming_url="ws://relational.com/stream", is_live_mode=True)
     connection = BrokerageConnection(
         user_id=user.id,
         broker_id=broker.id,
         access_token="token123"
     )
-    session.add(connection)
+    session.add_all([user, broker, connection])
     session.commit()
-    session.refresh(connection)
 
     assert connection.broker.id == broker.id
-    assert broker.connections[0].id == connection.id
\ No newline at end of file
+    assert broker.connections[0].id == connection.id
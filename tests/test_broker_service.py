@@ -1,10 +1,14 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import bindparam
 from sqlmodel import select # New import
 from src.models.broker import Broker
-from src.config import BROKER_CONFIGS
 from src.services.broker_service import BrokerService
 import pytest
 
+# Statements built once per module and reused with bound parameters
+_BROKER_NAMES = select(Broker.name)
+_BROKER_SETTINGS_BY_NAME = select(Broker.base_url, Broker.is_live_mode).where(Broker.name == bindparam("name"))
+
 # Mock BROKER_CONFIGS for testing purposes
 @pytest.fixture
 def mock_broker_configs():
@@ -13,70 +17,66 @@ def mock_broker_configs():
         {"name": "MockBroker2", "base_url": "http://mock2.com", "streaming_url": "ws://mock2.com/stream", "is_live_mode": True},
     ]
 
-def test_initialize_brokers_adds_new(session, mock_broker_configs):
-    # Temporarily override BROKER_CONFIGS for this test
-    original_configs = list(BROKER_CONFIGS) # Save original
-    BROKER_CONFIGS[:] = mock_broker_configs # Apply mock
+@pytest.fixture
+def broker_service(session):
+    return BrokerService(session)
 
-    service = BrokerService(session)
-    service.initialize_brokers()
+def test_initialize_brokers_adds_new(session, broker_service, mock_broker_configs, monkeypatch):
+    # Override BROKER_CONFIGS in src.config and where BrokerService looks it up; monkeypatch restores both even if the test fails
+    monkeypatch.setattr("src.config.BROKER_CONFIGS", mock_broker_configs)
+    monkeypatch.setattr("src.services.broker_service.BROKER_CONFIGS", mock_broker_configs)
 
-    brokers = session.exec(select(Broker)).all()
-    assert len(brokers) >= len(mock_broker_configs) # Account for other tests adding brokers
-    assert any(b.name == "MockBroker1" for b in brokers)
-    assert any(b.name == "MockBroker2" for b in brokers)
+    broker_service.initialize_brokers()
 
-    # Restore original configs
-    BROKER_CONFIGS[:] = original_configs
+    names = session.exec(_BROKER_NAMES).all() # Column select, no ORM objects to hydrate
+    assert len(names) >= len(mock_broker_configs) # Account for other tests adding brokers
+    assert "MockBroker1" in names
+    assert "MockBroker2" in names
 
-def test_initialize_brokers_updates_existing(session):
-    # Create an initial broker
-    existing_broker = Broker(name="UpdateBroker", base_url="http://old.com", streaming_url="ws://old.com/stream", is_live_mode=False)
-    session.add(existing_broker)
+def test_initialize_brokers_updates_existing(session, broker_service, monkeypatch):
+    # Create an initial broker; bulk insert skips the unit of work since the instance itself isn't needed
+    session.bulk_insert_mappings(Broker, [
+        {"name": "UpdateBroker", "base_url": "http://old.com", "streaming_url": "ws://old.com/stream", "is_live_mode": False},
+    ])
     session.commit()
-    session.refresh(existing_broker)
 
     # Temporarily override BROKER_CONFIGS to include an update for this broker
     mock_configs_update = [
         {"name": "UpdateBroker", "base_url": "http://new.com", "streaming_url": "ws://new.com/stream", "is_live_mode": True},
     ]
-    original_configs = list(BROKER_CONFIGS)
-    BROKER_CONFIGS[:] = mock_configs_update
-
-    service = BrokerService(session)
-    service.initialize_brokers()
+    monkeypatch.setattr("src.config.BROKER_CONFIGS", mock_configs_update)
+    monkeypatch.setattr("src.services.broker_service.BROKER_CONFIGS", mock_configs_update)
 
-    updated_broker = session.exec(select(Broker).where(Broker.name == "UpdateBroker")).first()
-    assert updated_broker.base_url == "http://new.com"
-    assert updated_broker.is_live_mode is True
+    broker_service.initialize_brokers()
 
-    # Restore original configs
-    BROKER_CONFIGS[:] = original_configs
+    base_url, is_live_mode = session.exec(_BROKER_SETTINGS_BY_NAME, params={"name": "UpdateBroker"}).one()
+    assert base_url == "http://new.com"
+    assert is_live_mode is True
 
-def test_get_broker_by_name(session):
+def test_get_broker_by_name(session, broker_service):
     broker = Broker(name="FindMeBroker", base_url="http://find.com", streaming_url="ws://find.com/stream", is_live_mode=False)
     session.add(broker)
     session.commit()
     session.refresh(broker)
 
-    service = BrokerService(session)
-    found_broker = service.get_broker_by_name("FindMeBroker")
+    found_broker = broker_service.get_broker_by_name("FindMeBroker")
     assert found_broker is not None
     assert found_broker.name == "FindMeBroker"
 
-    not_found_broker = service.get_broker_by_name("NonExistentBroker")
+    not_found_broker = broker_service.get_broker_by_name("NonExistentBroker")
     assert not_found_broker is None
 
-def test_get_all_brokers(session):
-    broker1 = Broker(name="AllBroker1", base_url="http://all1.com", streaming_url="ws://all1.com/stream", is_live_mode=False)
-    broker2 = Broker(name="AllBroker2", base_url="http://all2.com", streaming_url="ws://all2.com/stream", is_live_mode=True)
-    session.add_all([broker1, broker2])
+def test_get_all_brokers(session, broker_service):
+    session.bulk_insert_mappings(Broker, [
+        {"name": "AllBroker1", "base_url": "http://all1.com", "streaming_url": "ws://all1.com/stream", "is_live_mode": False},
+        {"name": "AllBroker2", "base_url": "http://all2.com", "streaming_url": "ws://all2.com/stream", "is_live_mode": True},
+    ])
     session.commit()
 
-    service = BrokerService(session)
-    all_brokers = service.get_all_brokers()
+    all_brokers = broker_service.get_all_brokers()
     
     # Check if the newly added brokers are in the list
-    assert any(b.name == "AllBroker1" for b in all_brokers)
-    assert any(b.name == "AllBroker2" for b in all_brokers)
+    names = {b.name for b in all_brokers}
+    assert "AllBroker1" in names
+    assert "AllBroker2" in names
     assert len(all_brokers) >= 2 # Ensure at least these two are present
\ No newline at end of file
@@ -1,41 +1,57 @@
 import asyncio
+import urllib.parse
 import pytest
-from datetime import datetime, timezone, timedelta # Import timedelta
-from unittest.mock import patch
-from sqlmodel import select # Import select
+import pytest_asyncio
+from datetime import datetime, timezone
+from unittest.mock import DEFAULT, patch
+from sqlalchemy import func, insert
+from sqlmodel import Session, select # Import select
 from src.models.brokerage_connection import BrokerageConnection
 from src.models.user import User
 from src.models.broker import Broker # New import
 from src.brokerage.tradier_adapter import TradierAdapter # Import TradierAdapter
 from unittest.mock import MagicMock # Import MagicMock
+from types import SimpleNamespace
 from src.config import settings # Import settings
-
-@pytest.fixture
-def default_broker(session):
+from src.utils.encryption import EncryptionUtil
+
+_FAR_FUTURE = datetime(2099, 1, 1, tzinfo=timezone.utc) # Token expiry; only needs to be in the future
+
+# Tradier endpoints the adapter tests expect, built once from the stub broker's base URL and account id
+_ACCESS_TOKEN = "mock_token"
+_BROKER_BASE_URL = "http://default.com"
+_ACCOUNT_ID = "mock_account_id"
+_API = f"{_BROKER_BASE_URL}/v1"
+OPTION_CHAIN_URL = f"{_API}/markets/options/chains"
+QUOTES_URL = f"{_API}/markets/quotes"
+POSITIONS_URL = f"{_API}/accounts/{_ACCOUNT_ID}/positions"
+ORDERS_URL = f"{_API}/accounts/{_ACCOUNT_ID}/orders"
+
+@pytest.fixture(scope="module")
+def default_broker(engine):
+    # Committed once for the whole module; each test's own rows are still rolled back by the session fixture
     broker = Broker(name="DefaultTestBroker", base_url="http://default.com", streaming_url="ws://default.com/stream", is_live_mode=False)
-    session.add(broker)
-    session.commit()
-    session.refresh(broker)
-    return broker
-
-def test_create_brokerage_connection(session, default_broker):
+    with Session(engine, expire_on_commit=False) as setup_session:
+        setup_session.add(broker)
+        setup_session.commit()
+    yield broker
+    with Session(engine) as teardown_session:
+        teardown_session.delete(teardown_session.get(Broker, broker.id))
+        teardown_session.commit()
+
+def test_create_brokerage_connection(session, make_user, default_broker):
     """Test that a BrokerageConnection can be created and retrieved."""
-    user = User(username="testuser", email="test@example.com", hashed_password="hashed_password")
-    session.add(user)
-    session.commit()
-    session.refresh(user)
-
+    user = make_user("testuser", email="test@example.com")
     connection = BrokerageConnection(
         user_id=user.id,
         broker_id=default_broker.id, # Now requires broker_id
         access_token="test_access_token",
         refresh_token="test_refresh_token",
         connection_status="connected",
-        expires_at=datetime.now(timezone.utc) + timedelta(hours=1) # Added expires_at
+        expires_at=_FAR_FUTURE # Added expires_at
     )
     session.add(connection)
     session.commit()
-    session.refresh(connection)
 
     assert connection.id is not None
     assert connection.user_id == user.id
@@ -49,13 +65,9 @@ def test_create_brokerage_connection(session, default_broker):
     assert connection.user.username == "testuser"
     assert connection.broker.name == "DefaultTestBroker"
 
-def test_brokerage_connection_encryption_methods(session, default_broker):
+def test_brokerage_connection_encryption_methods(session, make_user, default_broker):
     """Test the encryption/decryption methods."""
-    user = User(username="anotheruser", email="another@example.com", hashed_password="another_hashed_password")
-    session.add(user)
-    session.commit()
-    session.refresh(user)
-
+    user = make_user("anotheruser", email="another@example.com", hashed_password="another_hashed_password")
     connection = BrokerageConnection(
         user_id=user.id,
         broker_id=default_broker.id,
@@ -64,47 +76,67 @@ def test_brokerage_connection_encryption_methods(session, default_broker):
         access_token="token",
         refresh_token="refresh",
         connection_status="disconnected",
-        expires_at=datetime.now(timezone.utc) + timedelta(hours=1)
+        expires_at=_FAR_FUTURE
     )
     session.add(connection)
     session.commit()
-    session.refresh(connection)
 
+    # Re-encrypt every field in memory, then round-trip them through the database once
     new_api_key = "new_api_key_value"
-    connection.encrypt_field('api_key', new_api_key)
-    session.add(connection)
-    session.commit()
-    session.refresh(connection)
-    assert connection.decrypted_api_key == new_api_key
-
     new_api_secret = "new_api_secret_value"
+    new_access_token = "new_access_token_value"
+    new_refresh_token = "new_refresh_token_value"
+    connection.encrypt_field('api_key', new_api_key)
     connection.encrypt_field('api_secret', new_api_secret)
+    connection.encrypt_field('access_token', new_access_token)
+    connection.encrypt_field('refresh_token', new_refresh_token)
     session.add(connection)
     session.commit()
     session.refresh(connection)
+
+    assert connection.decrypted_api_key == new_api_key
     assert connection.decrypt_api_secret() == new_api_secret
+    assert connection.decrypt_access_token() == new_access_token
+    assert connection.decrypt_refresh_token() == new_refresh_token
 
-    new_access_token = "new_access_token_value"
-    connection.encrypt_field('access_token', new_access_token)
+def test_brokerage_connection_from_encrypted(session, make_user, default_broker):
+    """Test that from_encrypted stores ciphertext as-is and it decrypts back to the original values."""
+    user = make_user("encrypteduser", email="encrypted@example.com")
+    encryption_util = EncryptionUtil(key=settings.encryption_key)
+    api_key_ct = encryption_util.encrypt("mock_api_key").encode('utf-8')
+    access_token_ct = encryption_util.encrypt("mock_token").encode('utf-8')
+    connection = BrokerageConnection.from_encrypted(
+        user_id=user.id,
+        broker_id=default_broker.id,
+        api_key=api_key_ct,
+        access_token=access_token_ct,
+        connection_status="connected"
+    )
     session.add(connection)
     session.commit()
-    session.refresh(connection)
-    assert connection.decrypt_access_token() == new_access_token
 
-    new_refresh_token = "new_refresh_token_value"
-    connection.encrypt_field('refresh_token', new_refresh_token)
+    assert connection.api_key == api_key_ct
+    assert connection.access_token == access_token_ct
+    assert connection.api_secret is None
+    assert connection.decrypted_api_key == "mock_api_key"
+    assert connection.decrypt_access_token() == "mock_token"
+    assert connection.connection_status == "connected"
+
+def test_brokerage_connection_decrypts_after_reload(session, make_user, default_broker):
+    """Test that a connection loaded from the database (bypassing __init__) can still decrypt its fields."""
+    user = make_user("reloaduser", email="reload@example.com")
+    connection = BrokerageConnection(user_id=user.id, broker_id=default_broker.id, access_token="reload_token")
     session.add(connection)
     session.commit()
-    session.refresh(connection)
-    assert connection.decrypt_refresh_token() == new_refresh_token
+    session.expunge_all()
 
-def test_brokerage_connection_repr(session, default_broker):
-    """Test the __repr__ method of BrokerageConnection."""
-    user = User(username="repruser", email="repr@example.com", hashed_password="repr_password")
-    session.add(user)
-    session.commit()
-    session.refresh(user)
+    reloaded = session.get(BrokerageConnection, connection.id)
+    assert reloaded is not connection
+    assert reloaded.decrypt_access_token() == "reload_token"
 
+def test_brokerage_connection_repr(session, make_user, default_broker):
+    """Test the __repr__ method of BrokerageConnection."""
+    user = make_user("repruser", email="repr@example.com", hashed_password="repr_password")
     connection = BrokerageConnection(
         user_id=user.id,
         broker_id=default_broker.id,
@@ -113,18 +145,13 @@ def test_brokerage_connection_repr(session, default_broker):
     )
     session.add(connection)
     session.commit()
-    session.refresh(connection)
 
     expected_repr = f"<BrokerageConnection(id={connection.id}, user_id={user.id}, broker_id={default_broker.id}, status='connected')>"
     assert repr(connection) == expected_repr
 
-def test_brokerage_connection_on_user_delete_cascade(session, default_broker):
+def test_brokerage_connection_on_user_delete_cascade(session, make_user, default_broker):
     """Test CASCADE delete on user_id."""
-    user = User(username="cascadeuser", email="cascade@example.com", hashed_password="hashed_password")
-    session.add(user)
-    session.commit()
-    session.refresh(user)
-
+    user = make_user("cascadeuser", email="cascade@example.com")
     connection = BrokerageConnection(
         user_id=user.id,
         broker_id=default_broker.id,
@@ -132,7 +159,6 @@ def test_brokerage_connection_on_user_delete_cascade(session, default_broker):
     )
     session.add(connection)
     session.commit()
-    session.refresh(connection)
 
     connection_id = connection.id
     user_id = user.id
@@ -142,304 +168,264 @@ def test_brokerage_connection_on_user_delete_cascade(session, default_broker):
     session.commit()
 
     # Try to retrieve the connection, it should be deleted
-    deleted_connection = session.exec(select(BrokerageConnection).where(BrokerageConnection.id == connection_id)).first()
+    deleted_connection = session.get(BrokerageConnection, connection_id)
     assert deleted_connection is None
 
     # Ensure user is also deleted
-    deleted_user = session.exec(select(User).where(User.id == user_id)).first()
+    deleted_user = session.get(User, user_id)
     assert deleted_user is None
 
 
-@pytest.fixture
-def tradier_connection(session, default_broker):
-    user = User(username="tradieruser", email="tradier@example.com", hashed_password="hashed_password")
-    session.add(user)
+@pytest.mark.parametrize("num_connections", [10, 100])
+def test_brokerage_connection_on_user_delete_cascade_bulk(session, make_user, default_broker, num_connections):
+    """Test CASCADE delete on user_id across many bulk-inserted connections."""
+    user = make_user("bulkcascadeuser", email="bulkcascade@example.com")
+
+    access_token = EncryptionUtil(key=settings.encryption_key).encrypt("key").encode('utf-8') # Encrypt once, reuse the ciphertext
+    session.execute(insert(BrokerageConnection.__table__), [
+        {"user_id": user.id, "broker_id": default_broker.id, "access_token": access_token, "connection_status": "connected"}
+        for _ in range(num_connections)
+    ])
     session.commit()
-    session.refresh(user)
-    connection = BrokerageConnection(
-        user_id=user.id,
-        broker_id=default_broker.id,
-        api_key="mock_account_id", # Use api_key as account_id for tests
-        api_secret="mock_api_secret",
-        access_token="mock_token",
-        refresh_token="mock_refresh_token",
-        connection_status="connected",
-        expires_at=datetime.now(timezone.utc) + timedelta(hours=1)
-    )
-    session.add(connection)
+    user_connections = select(func.count()).select_from(BrokerageConnection).where(BrokerageConnection.user_id == user.id)
+    assert session.exec(user_connections).one() == num_connections
+
+    # Delete the user
+    session.delete(user)
     session.commit()
-    session.refresh(connection)
-    return connection
 
-@pytest.mark.asyncio
-async def test_tradier_adapter_get_option_chain(session, tradier_connection, mock_tradier_option_chain_response, default_broker):
-    """Test get_option_chain method of TradierAdapter."""
-    # Create a real TradierAdapter instance using the connection object
-    adapter = TradierAdapter(broker=default_broker, connection=tradier_connection)
-    
-    # Mock the requests.get call
-    with patch('requests.get') as mock_get:
-        mock_get.return_value.status_code = 200
-        mock_get.return_value.json.return_value = mock_tradier_option_chain_response
-        mock_get.return_value.raise_for_status.return_value = None
-
-        option_chain = await adapter.get_option_chain("SPY", "2025-06-19")
-        assert isinstance(option_chain, list)
-        assert len(option_chain) > 0
-        assert option_chain[0]['symbol'] == 'SPY240621C00500000'
-        mock_get.assert_called_once_with(
-            f"{adapter._base_url}/{adapter._version}/markets/options/chains",
-            headers={
-                "Authorization": f"Bearer {tradier_connection.decrypt_access_token()}",
-                "Accept": "application/json"
-            },
-            params={"symbol": "SPY", "expiration": "2025-06-19"}
-        )
+    assert session.exec(user_connections).one() == 0
+
+@pytest.fixture(scope="module")
+def tradier_connection_stub():
+    """Stands in for a BrokerageConnection; the adapter only reads the decrypted credentials."""
+    conn = MagicMock(spec=BrokerageConnection)
+    conn.decrypted_access_token = _ACCESS_TOKEN
+    conn.decrypted_api_key = _ACCOUNT_ID # Use api_key as account_id for tests
+    conn.decrypt_access_token.return_value = _ACCESS_TOKEN
+    return conn
+
+@pytest.fixture(scope="module")
+def tradier_broker_stub():
+    broker = MagicMock(spec=Broker)
+    broker.base_url = _BROKER_BASE_URL
+    return broker
 
-@pytest.mark.asyncio
-async def test_tradier_adapter_place_order(session, tradier_connection, mock_tradier_place_order_response, default_broker):
-    """Test place_order method of TradierAdapter."""
-    # Create a real TradierAdapter instance using the connection object
-    adapter = TradierAdapter(broker=default_broker, connection=tradier_connection)
-
-    with patch('requests.post') as mock_post:
-        mock_post.return_value.status_code = 200
-        mock_post.return_value.json.return_value = mock_tradier_place_order_response
-        mock_post.return_value.raise_for_status.return_value = None
-
-        order_details = await adapter.place_order("AAPL", 10, "market", "equity", "day", "buy")
-        assert isinstance(order_details, dict)
-        assert order_details['status'] == 'ok'
-        assert order_details['id'] == 12345
-        mock_post.assert_called_once_with(
-            f"{adapter._base_url}/{adapter._version}/accounts/{tradier_connection.decrypted_api_key}/orders",
-            headers={
-                "Authorization": f"Bearer {tradier_connection.decrypt_access_token()}",
-                "Accept": "application/json",
-                "Content-Type": "application/x-www-form-urlencoded"
-            },
-            data={
-                "class": "equity",
-                "symbol": "AAPL",
-                "duration": "day",
-                "side": "buy",
-                "quantity": 10,
-                "type": "market"
+@pytest_asyncio.fixture(scope="module")
+async def tradier_adapter(tradier_api_module, tradier_connection_stub, tradier_broker_stub):
+    """One TradierAdapter for the module; its async client talks to the mock Tradier API and is closed at module teardown."""
+    adapter = TradierAdapter(broker=tradier_broker_stub, connection=tradier_connection_stub, transport=tradier_api_module.transport)
+    yield adapter
+    await adapter.aclose()
+
+@pytest.fixture(scope="module")
+def mock_requests():
+    """Patch requests.get/post/delete once for the whole module."""
+    with patch.multiple("requests", get=DEFAULT, post=DEFAULT, delete=DEFAULT) as mocks:
+        yield SimpleNamespace(**mocks)
+
+@pytest.fixture(autouse=True)
+def _reset_requests(mock_requests):
+    # Clear recorded calls and configured responses left over from the previous test
+    mock_requests.get.reset_mock(return_value=True)
+    mock_requests.post.reset_mock(return_value=True)
+    mock_requests.delete.reset_mock(return_value=True)
+
+# Tradier API response payloads; tests only read them, so they are plain module constants
+MOCK_TRADIER_OPTION_CHAIN_RESPONSE = {
+    "options": {
+        "option": [
+            {
+                "symbol": "SPY240621C00500000",
+                "description": "SPY JUN 21 24 500 Call",
+                "exch": "PHLX",
+                "type": "call",
+                "last": 0.0,
+                "change": 0.0,
+                "bid": 0.0,
+                "ask": 0.0,
+                "volume": 0,
+                "open_interest": 0,
+                "underlying": "SPY",
+                "strike": 500.0,
+                "expiration_date": "2024-06-21",
+                "trade_date": "2024-05-20",
+                "greeks": {
+                    "delta": 0.0,
+                    "gamma": 0.0,
+                    "theta": 0.0,
+                    "vega": 0.0,
+                    "rho": 0.0,
+                    "impliedVolatility": 0.0,
+                    "bidIv": 0.0,
+                    "askIv": 0.0
+                }
             }
-        )
-
-def test_tradier_adapter_get_positions(session, tradier_connection, mock_tradier_positions_response, default_broker):
-    """Test get_positions method of TradierAdapter."""
-    # Create a real TradierAdapter instance using the connection object
-    adapter = TradierAdapter(broker=default_broker, connection=tradier_connection)
-
-    with patch('requests.get') as mock_get:
-        mock_get.return_value.status_code = 200
-        mock_get.return_value.json.return_value = mock_tradier_positions_response
-        mock_get.return_value.raise_for_status.return_value = None
-
-        positions = adapter.get_positions()
-        assert isinstance(positions, list)
-        assert len(positions) > 0
-        assert positions[0]['symbol'] == 'MSFT'
-        mock_get.assert_called_once_with(
-            f"{adapter._base_url}/{adapter._version}/accounts/{tradier_connection.decrypted_api_key}/positions",
-            headers={
-                "Authorization": f"Bearer {tradier_connection.decrypt_access_token()}",
-                "Accept": "application/json"
+        ]
+    }
+}
+
+MOCK_TRADIER_PLACE_ORDER_RESPONSE = {
+    "order": {
+        "id": 12345,
+        "status": "ok",
+        "exec_quantity": 0,
+        "remaining_quantity": 10,
+        "create_date": "2024-05-20 10:00:00.000",
+        "transaction_date": "2024-05-20 10:00:00.000",
+        "class": "equity",
+        "symbol": "AAPL",
+        "type": "market",
+        "side": "buy",
+        "quantity": 10,
+        "strategy": "single",
+        "tag": "my_order_tag"
+    }
+}
+
+MOCK_TRADIER_POSITIONS_RESPONSE = {
+    "positions": {
+        "position": [
+            {
+                "symbol": "MSFT",
+                "qty": 100,
+                "cost_basis": 150.0,
+                "open_date": "2023-01-01",
+                "purchase_price": 150.0,
+                "current_value": 16000.0
             }
-        )
-
-@pytest.mark.asyncio
-async def test_tradier_adapter_get_quotes(session, tradier_connection, mock_tradier_quotes_response, default_broker):
-    """Test get_quotes method of TradierAdapter."""
-    # Create a real TradierAdapter instance using the connection object
-    adapter = TradierAdapter(broker=default_broker, connection=tradier_connection)
-
-    with patch('requests.get') as mock_get:
-        mock_get.return_value.status_code = 200
-        mock_get.return_value.json.return_value = mock_tradier_quotes_response
-        mock_get.return_value.raise_for_status.return_value = None
-
-        quotes = await adapter.get_quotes(["GOOG", "AMZN"])
-        assert isinstance(quotes, dict)
-        assert "GOOG" in quotes
-        assert "AMZN" in quotes
-        assert quotes["GOOG"]["description"] == "Alphabet Inc. Class C"
-        mock_get.assert_called_once_with(
-            f"{adapter._base_url}/{adapter._version}/markets/quotes",
-            headers={
-                "Authorization": f"Bearer {tradier_connection.decrypt_access_token()}",
-                "Accept": "application/json"
+        ]
+    }
+}
+
+MOCK_TRADIER_QUOTES_RESPONSE = {
+    "quotes": {
+        "quote": [
+            {
+                "symbol": "GOOG",
+                "description": "Alphabet Inc. Class C",
+                "last": 170.0,
+                "bid": 169.9,
+                "ask": 170.1
             },
-            params={"symbols": "GOOG,AMZN"}
-        )
-
-def test_tradier_adapter_get_orders(session, tradier_connection, mock_tradier_orders_response, default_broker):
-    """Test get_orders method of TradierAdapter."""
-    # Create a real TradierAdapter instance using the connection object
-    adapter = TradierAdapter(broker=default_broker, connection=tradier_connection)
-
-    with patch('requests.get') as mock_get:
-        mock_get.return_value.status_code = 200
-        mock_get.return_value.json.return_value = mock_tradier_orders_response
-        mock_get.return_value.raise_for_status.return_value = None
-
-        orders = adapter.get_orders()
-        assert isinstance(orders, list)
-        assert len(orders) > 0
-        assert orders[0]['id'] == 123456
-        mock_get.assert_called_once_with(
-            f"{adapter._base_url}/{adapter._version}/accounts/{tradier_connection.decrypted_api_key}/orders",
-            headers={
-                "Authorization": f"Bearer {tradier_connection.decrypt_access_token()}",
-                "Accept": "application/json"
-            }
-        )
-
-def test_tradier_adapter_cancel_order(session, tradier_connection, mock_tradier_cancel_order_response, default_broker):
-    """Test cancel_order method of TradierAdapter."""
-    # Create a real TradierAdapter instance using the connection object
-    adapter = TradierAdapter(broker=default_broker, connection=tradier_connection)
-
-    with patch('requests.delete') as mock_delete:
-        mock_delete.return_value.status_code = 200
-        mock_delete.return_value.json.return_value = mock_tradier_cancel_order_response
-        mock_delete.return_value.raise_for_status.return_value = None
-
-        result = adapter.cancel_order("12345")
-        assert result is True
-        mock_delete.assert_called_once_with(
-            f"{adapter._base_url}/{adapter._version}/accounts/{tradier_connection.decrypted_api_key}/orders/12345",
-            headers={
-                "Authorization": f"Bearer {tradier_connection.decrypt_access_token()}",
-                "Accept": "application/json"
+            {
+                "symbol": "AMZN",
+                "description": "Amazon.com Inc.",
+                "last": 180.0,
+                "bid": 179.9,
+                "ask": 180.1
             }
-        )
-
-@pytest.fixture
-def mock_tradier_option_chain_response():
-    """Mock response for Tradier get_option_chain."""
-    return {
-        "options": {
-            "option": [
-                {
-                    "symbol": "SPY240621C00500000",
-                    "description": "SPY JUN 21 24 500 Call",
-                    "exch": "PHLX",
-                    "type": "call",
-                    "last": 0.0,
-                    "change": 0.0,
-                    "bid": 0.0,
-                    "ask": 0.0,
-                    "volume": 0,
-                    "open_interest": 0,
-                    "underlying": "SPY",
-                    "strike": 500.0,
-                    "expiration_date": "2024-06-21",
-                    "trade_date": "2024-05-20",
-                    "greeks": {
-                        "delta": 0.0,
-                        "gamma": 0.0,
-                        "theta": 0.0,
-                        "vega": 0.0,
-                        "rho": 0.0,
-                        "impliedVolatility": 0.0,
-                        "bidIv": 0.0,
-                        "askIv": 0.0
-                    }
-                }
-            ]
-        }
-    }
-
-@pytest.fixture
-def mock_tradier_place_order_response():
-    """Mock response for Tradier place_order."""
-    return {
-        "order": {
-            "id": 12345,
-            "status": "ok",
-            "exec_quantity": 0,
-            "remaining_quantity": 10,
-            "create_date": "2024-05-20 10:00:00.000",
-            "transaction_date": "2024-05-20 10:00:00.000",
-            "class": "equity",
-            "symbol": "AAPL",
-            "type": "market",
-            "side": "buy",
-            "quantity": 10,
-            "strategy": "single",
-            "tag": "my_order_tag"
-        }
-    }
-
-@pytest.fixture
-def mock_tradier_positions_response():
-    """Mock response for Tradier get_positions."""
-    return {
-        "positions": {
-            "position": [
-                {
-                    "symbol": "MSFT",
-                    "qty": 100,
-                    "cost_basis": 150.0,
-                    "open_date": "2023-01-01",
-                    "purchase_price": 150.0,
-                    "current_value": 16000.0
-                }
-            ]
-        }
+        ]
     }
-
-@pytest.fixture
-def mock_tradier_quotes_response():
-    """Mock response for Tradier get_quotes."""
-    return {
-        "quotes": {
-            "quote": [
-                {
-                    "symbol": "GOOG",
-                    "description": "Alphabet Inc. Class C",
-                    "last": 170.0,
-                    "bid": 169.9,
-                    "ask": 170.1
-                },
-                {
-                    "symbol": "AMZN",
-                    "description": "Amazon.com Inc.",
-                    "last": 180.0,
-                    "bid": 179.9,
-                    "ask": 180.1
-                }
-            ]
-        }
+}
+
+MOCK_TRADIER_ORDERS_RESPONSE = {
+    "orders": {
+        "order": [
+            {
+                "id": 123456,
+                "status": "open",
+                "symbol": "GOOG",
+                "type": "limit",
+                "quantity": 10,
+                "price": 160.0
+            }
+        ]
     }
+}
 
-@pytest.fixture
-def mock_tradier_orders_response():
-    """Mock response for Tradier get_orders."""
-    return {
-        "orders": {
-            "order": [
-                {
-                    "id": 123456,
-                    "status": "open",
-                    "symbol": "GOOG",
-                    "type": "limit",
-                    "quantity": 10,
-                    "price": 160.0
-                }
-            ]
-        }
+MOCK_TRADIER_CANCEL_ORDER_RESPONSE = {
+    "order": {
+        "id": 12345,
+        "status": "ok"
     }
-
-@pytest.fixture
-def mock_tradier_cancel_order_response():
-    """Mock response for Tradier cancel_order."""
-    return {
-        "order": {
-            "id": 12345,
-            "status": "ok"
+}
+
+_NON_JSON_BODY = "<html>maintenance</html>"
+
+# Async endpoints go through the adapter's httpx client: (call, response payload, HTTP method, URL, query params, form body, result check)
+ASYNC_ADAPTER_CASES = [
+    (lambda a: a.get_option_chain("SPY", "2025-06-19"), MOCK_TRADIER_OPTION_CHAIN_RESPONSE, "GET", OPTION_CHAIN_URL,
+     {"symbol": "SPY", "expiration": "2025-06-19"}, None,
+     lambda result: isinstance(result, list) and result[0]['symbol'] == 'SPY240621C00500000'),
+    (lambda a: a.place_order("AAPL", 10, "market", "equity", "day", "buy"), MOCK_TRADIER_PLACE_ORDER_RESPONSE, "POST", ORDERS_URL,
+     {}, {"class": "equity", "symbol": "AAPL", "duration": "day", "side": "buy", "quantity": "10", "type": "market"},
+     lambda result: isinstance(result, dict) and result['status'] == 'ok' and result['id'] == 12345),
+    (lambda a: a.get_quotes(["GOOG", "AMZN"]), MOCK_TRADIER_QUOTES_RESPONSE, "GET", QUOTES_URL,
+     {"symbols": "GOOG,AMZN"}, None,
+     lambda result: set(result) == {"GOOG", "AMZN"} and result["GOOG"]["description"] == "Alphabet Inc. Class C"),
+    # A 200 with a non-JSON body (e.g. a maintenance page) falls back to the empty result instead of raising
+    (lambda a: a.get_option_chain("SPY", "2025-06-19"), _NON_JSON_BODY, "GET", OPTION_CHAIN_URL,
+     {"symbol": "SPY", "expiration": "2025-06-19"}, None,
+     lambda result: result == []),
+    (lambda a: a.place_order("AAPL", 10, "market", "equity", "day", "buy"), _NON_JSON_BODY, "POST", ORDERS_URL,
+     {}, {"class": "equity", "symbol": "AAPL", "duration": "day", "side": "buy", "quantity": "10", "type": "market"},
+     lambda result: result == {}),
+    (lambda a: a.get_quotes(["GOOG", "AMZN"]), _NON_JSON_BODY, "GET", QUOTES_URL,
+     {"symbols": "GOOG,AMZN"}, None,
+     lambda result: result == {}),
+]
+
+@pytest.mark.xdist_group("tradier_adapter") # Keep on one worker so the module-scoped mocks are built once
+@pytest.mark.asyncio
+@pytest.mark.parametrize("adapter_call,response,http_method,url,params,form,check_result", ASYNC_ADAPTER_CASES,
+                         ids=["get_option_chain", "place_order", "get_quotes",
+                              "get_option_chain_non_json", "place_order_non_json", "get_quotes_non_json"])
+async def test_tradier_adapter_async_calls(tradier_api, tradier_adapter,
+                                           adapter_call, response, http_method, url, params, form, check_result):
+    """Test the async TradierAdapter methods against a mock Tradier API."""
+    tradier_api.json = response
+
+    result = await adapter_call(tradier_adapter)
+
+    assert check_result(result)
+    assert len(tradier_api.calls) == 1
+    sent = tradier_api.calls[-1]
+    assert sent.method == http_method
+    assert str(sent.url.copy_with(query=None)) == url
+    assert dict(sent.url.params) == params
+    assert sent.headers["Authorization"] == f"Bearer {_ACCESS_TOKEN}"
+    assert sent.headers["Accept"] == "application/json"
+    if form is not None:
+        assert sent.headers["Content-Type"] == "application/x-www-form-urlencoded"
+        assert dict(urllib.parse.parse_qsl(sent.content.decode())) == form
+
+@pytest.mark.xdist_group("tradier_adapter")
+@pytest.mark.asyncio
+async def test_tradier_adapter_aclose(tradier_api, tradier_connection_stub, tradier_broker_stub):
+    """aclose() shuts the adapter's httpx client and its connection pool."""
+    adapter = TradierAdapter(broker=tradier_broker_stub, connection=tradier_connection_stub, transport=tradier_api.transport)
+    await adapter.aclose()
+    assert adapter._client.is_closed
+
+# Sync endpoints still use requests: (call, response payload, requests function, URL, result check)
+SYNC_ADAPTER_CASES = [
+    (lambda a: a.get_positions(), MOCK_TRADIER_POSITIONS_RESPONSE, "get", POSITIONS_URL,
+     lambda result: isinstance(result, list) and result[0]['symbol'] == 'MSFT'),
+    (lambda a: a.get_orders(), MOCK_TRADIER_ORDERS_RESPONSE, "get", ORDERS_URL,
+     lambda result: isinstance(result, list) and result[0]['id'] == 123456),
+    (lambda a: a.cancel_order("12345"), MOCK_TRADIER_CANCEL_ORDER_RESPONSE, "delete", f"{ORDERS_URL}/12345",
+     lambda result: result is True),
+]
+
+@pytest.mark.xdist_group("tradier_adapter")
+@pytest.mark.parametrize("adapter_call,response,requests_function,url,check_result", SYNC_ADAPTER_CASES,
+                         ids=["get_positions", "get_orders", "cancel_order"])
+def test_tradier_adapter_sync_calls(mock_requests, tradier_adapter,
+                                    adapter_call, response, requests_function, url, check_result):
+    """Test the synchronous TradierAdapter methods against mocked requests calls."""
+    mock_call = getattr(mock_requests, requests_function)
+    mock_call.return_value.status_code = 200
+    mock_call.return_value.json.return_value = response
+    mock_call.return_value.raise_for_status.return_value = None
+
+    result = adapter_call(tradier_adapter)
+
+    assert check_result(result)
+    mock_call.assert_called_once_with(
+        url,
+        headers={
+            "Authorization": f"Bearer {_ACCESS_TOKEN}",
+            "Accept": "application/json"
         }
-    }
\ No newline at end of file
+    )
@@ -25,31 +25,32 @@ def test_validate_input_parameters():
     with pytest.raises(ValueError, match="Win/loss ratio must be positive."):
         validate_input_parameters(0.5, -1.0)
 
-def test_calculate_kelly_percentage():
-    # Test cases with positive edge
-    assert calculate_kelly_percentage(0.6, 1.5) == pytest.approx(0.3333333333333333)
-    assert calculate_kelly_percentage(0.7, 2.0) == pytest.approx(0.55)
-    assert calculate_kelly_percentage(0.5, 1.0) == pytest.approx(0.0) # No edge, should be 0
-
-    # Test cases with negative edge (should return 0)
-    assert calculate_kelly_percentage(0.4, 1.5) == pytest.approx(0.0)
-    assert calculate_kelly_percentage(0.3, 0.5) == pytest.approx(0.0)
+# (win_probability, win_loss_ratio, expected Kelly percentage)
+KELLY_PERCENTAGE_CASES = [
+    # Positive edge
+    (0.6, 1.5, 0.3333333333333333),
+    (0.7, 2.0, 0.55),
+    (0.5, 1.0, 0.0), # No edge, should be 0
+    # Negative edge (should return 0)
+    (0.4, 1.5, 0.0),
+    (0.3, 0.5, 0.0),
+    # Boundary values for win_probability
+    (0.0, 2.0, 0.0),
+    (1.0, 2.0, 1.0),
+    # Extreme win_loss_ratio values (validate_input_parameters rejects non-positive ratios before this is called)
+    (0.6, 0.0001, 0.0), # Very low ratio, likely negative Kelly
+    (0.6, 10000.0, 0.59996), # Very high ratio, close to win_probability
+]
 
-    # Test boundary values for win_probability
-    assert calculate_kelly_percentage(0.0, 2.0) == pytest.approx(0.0)
-    assert calculate_kelly_percentage(1.0, 2.0) == pytest.approx(1.0)
-
-    # Test boundary values for win_loss_ratio (already handled by validate_input_parameters)
-    # These tests assume validate_input_parameters is called before, so only valid ratios are passed.
-    assert calculate_kelly_percentage(0.6, 0.0001) == pytest.approx(0.0) # Very low ratio, likely negative Kelly
-    assert calculate_kelly_percentage(0.6, 10000.0) == pytest.approx(0.59996) # Very high ratio, close to win_probability
+def test_calculate_kelly_percentage():
+    # Compare every case in a single approx check instead of one per assert
+    actual = [calculate_kelly_percentage(win_probability, ratio) for win_probability, ratio, _ in KELLY_PERCENTAGE_CASES]
+    assert actual == pytest.approx([expected for _, _, expected in KELLY_PERCENTAGE_CASES])
 
 def test_calculate_fractional_kelly():
     # Test with positive full Kelly percentage
-    assert calculate_fractional_kelly(0.2666666666666666) == pytest.approx(0.2666666666666666 * GOLDEN_RATIO)
-    assert calculate_fractional_kelly(0.45) == pytest.approx(0.45 * GOLDEN_RATIO)
-    assert calculate_fractional_kelly(0.0) == pytest.approx(0.0)
-    assert calculate_fractional_kelly(1.0) == pytest.approx(1.0 * GOLDEN_RATIO)
+    full_kelly = [0.2666666666666666, 0.45, 0.0, 1.0]
+    assert [calculate_fractional_kelly(k) for k in full_kelly] == pytest.approx([k * GOLDEN_RATIO for k in full_kelly])
 
     # Test with negative full Kelly percentage (should raise ValueError)
     with pytest.raises(ValueError, match="Full Kelly percentage cannot be negative."):
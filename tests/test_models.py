@@ -1,35 +1,86 @@
 import pytest
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from src.model.base import BaseModel as Base
-from src.models import User, Session, BrokerageConnection, BotInstance, StrategyDefinition, StrategyParameter, TradeOrder, Position, Broker # Import Broker
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session as ORMSession, joinedload, sessionmaker
+from src.models import User, BrokerageConnection, BotInstance, StrategyDefinition, StrategyParameter, TradeOrder, Position, Broker # Import Broker
+from src.models import Session as SessionModel # The login-session model, not an ORM session
 from src.config import settings
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 from src.utils.encryption import generate_key # Import generate_key
 
-# Use an in-memory SQLite database for testing
-DATABASE_URL = "sqlite:///:memory:"
+_TEST_KEY = generate_key() # A valid Fernet key, generated once for the module
+_FUTURE = datetime(2999, 1, 1, tzinfo=timezone.utc) # Expiry far enough ahead that no test depends on the clock
 
-@pytest.fixture(scope="module")
-def engine():
-    return create_engine(DATABASE_URL)
+# Runs on the session-scoped in-memory engine from conftest, whose schema is created once per test session
+# Bound to the shared connection per test: commit() only releases a SAVEPOINT, tests flush explicitly,
+# and committed attributes stay loaded instead of being re-SELECTed on access
+_Session = sessionmaker(join_transaction_mode="create_savepoint", autoflush=False, expire_on_commit=False)
 
 @pytest.fixture(scope="module")
-def tables(engine):
-    Base.metadata.create_all(engine)
-    yield
-    Base.metadata.drop_all(engine)
+def db_connection(engine):
+    """One connection reused by every test in the module."""
+    connection = engine.connect()
+    yield connection
+    connection.close()
 
 @pytest.fixture(scope="function")
-def db_session(engine, tables):
-    """Returns an sqlalchemy session, and after the test tears down everything."""
-    connection = engine.connect()
-    Session = sessionmaker(bind=connection)
-    session = Session()
+def db_session(db_connection):
+    """Returns an sqlalchemy session inside an outer transaction that is rolled back after the test."""
+    transaction = db_connection.begin()
+    session = _Session(bind=db_connection)
     yield session
-    session.rollback() # Rollback the session's transaction
     session.close()
-    connection.close()
+    transaction.rollback() # Discard everything the test wrote
+
+@pytest.fixture
+def make_brokerage_connection(monkeypatch):
+    """Factory for BrokerageConnections encrypted with the module's test key; monkeypatch restores the real key on teardown."""
+    monkeypatch.setattr(settings, "encryption_key", _TEST_KEY)
+    return BrokerageConnection
+
+def _persist(engine, obj):
+    """Commit obj outside any test transaction so it survives per-test rollbacks."""
+    with ORMSession(engine, expire_on_commit=False) as session:
+        session.add(obj)
+        session.commit()
+    return obj
+
+def _remove(engine, obj):
+    with ORMSession(engine) as session:
+        session.delete(session.get(type(obj), obj.id))
+        session.commit()
+
+# User -> Strategy/Broker -> BrokerageConnection -> BotInstance, built once per module and shared read-only by the tests
+@pytest.fixture(scope="module")
+def base_user(engine):
+    user = _persist(engine, User(username="graphuser", hashed_password="hp"))
+    yield user
+    _remove(engine, user)
+
+@pytest.fixture(scope="module")
+def base_broker(engine):
+    broker = _persist(engine, Broker(name="TestBrokerGraph", base_url="http://testgraph.com", streaming_url="ws://testgraph.com/stream", is_live_mode=False))
+    yield broker
+    _remove(engine, broker)
+
+@pytest.fixture(scope="module")
+def base_strategy(engine, base_user):
+    strategy = _persist(engine, StrategyDefinition(name="GraphStrategy", file_path="graph.py", class_name="GraphStrategyClass", created_by=base_user.id))
+    yield strategy
+    _remove(engine, strategy)
+
+@pytest.fixture(scope="module")
+def base_conn(engine, base_user, base_broker):
+    # Only FK filler here, so store placeholder ciphertext instead of paying for encryption; test_brokerage_connection_encryption covers the cipher
+    conn = _persist(engine, BrokerageConnection.from_encrypted(user_id=base_user.id, broker_id=base_broker.id, access_token=b"test_api_key_graph", api_secret=b"test_api_secret_graph"))
+    yield conn
+    _remove(engine, conn)
+
+@pytest.fixture(scope="module")
+def base_bot(engine, base_user, base_strategy, base_conn):
+    bot = _persist(engine, BotInstance(user_id=base_user.id, strategy_id=base_strategy.id, brokerage_connection_id=base_conn.id, name="GraphBot", status="running"))
+    yield bot
+    _remove(engine, bot)
 
 def test_user_creation(db_session):
     user = User(username="testuser", hashed_password="hashedpassword", email="test@example.com")
@@ -43,255 +94,130 @@ def test_user_unique_username(db_session):
     user2 = User(username="uniqueuser", hashed_password="hashedpassword2")
     db_session.add(user1)
     db_session.commit()
-    with pytest.raises(Exception): # Expecting IntegrityError or similar
-        db_session.add(user2)
-        db_session.commit()
+    with pytest.raises(IntegrityError):
+        with db_session.begin_nested(): # Only the SAVEPOINT is rolled back; the test transaction stays usable
+            db_session.add(user2)
+            db_session.flush()
 
 def test_user_unique_email(db_session):
     user1 = User(username="userA", hashed_password="hpA", email="email@example.com")
     user2 = User(username="userB", hashed_password="hpB", email="email@example.com")
     db_session.add(user1)
     db_session.commit()
-    with pytest.raises(Exception): # Expecting IntegrityError or similar
-        db_session.add(user2)
-        db_session.commit()
+    with pytest.raises(IntegrityError):
+        with db_session.begin_nested(): # Only the SAVEPOINT is rolled back; the test transaction stays usable
+            db_session.add(user2)
+            db_session.flush()
 
 def test_session_creation(db_session):
     user = User(username="sessionuser", hashed_password="hp")
     db_session.add(user)
-    db_session.commit()
-    session = Session(user_id=user.id, access_token="someaccesstoken", refresh_token="somerefreshtoken", expires_at=datetime.now(timezone.utc) + timedelta(days=1))
+    db_session.flush() # Populate user.id without ending the transaction
+    session = SessionModel(user_id=user.id, access_token="someaccesstoken", refresh_token="somerefreshtoken", expires_at=_FUTURE)
     db_session.add(session)
     db_session.commit()
     assert session.session_id is not None
     assert session.user.username == "sessionuser"
 
-def test_brokerage_connection_creation(db_session):
-    user = User(username="brokeruser", hashed_password="hp")
-    db_session.add(user)
-    db_session.commit()
-    db_session.refresh(user) # Refresh user to get its ID
-
-    broker = Broker(name="TestBrokerConn", base_url="http://testconn.com", streaming_url="ws://testconn.com/stream", is_live_mode=False)
-    db_session.add(broker)
+def test_brokerage_connection_persists(db_session, base_user, base_broker):
+    conn = BrokerageConnection.from_encrypted(user_id=base_user.id, broker_id=base_broker.id, access_token=b"test_access_token")
+    db_session.add(conn)
     db_session.commit()
-    db_session.refresh(broker) # Refresh broker to get its ID
 
-    # Generate a valid Fernet key for testing
-    test_encryption_key = generate_key()
-    # Temporarily override the settings.encryption_key for this test
-    original_encryption_key = settings.encryption_key
-    settings.encryption_key = test_encryption_key
-
-    conn = BrokerageConnection(
-        user_id=user.id,
-        broker_id=broker.id, # New required argument
+    assert conn.id is not None
+    assert conn.user.username == "graphuser"
+    assert conn.broker.name == "TestBrokerGraph" # Verify relationship
+
+def test_brokerage_connection_encryption(make_brokerage_connection):
+    # Pure cipher round-trip; nothing here needs the database
+    conn = make_brokerage_connection(
+        user_id=1,
+        broker_id=1,
         access_token="test_access_token",
         refresh_token="test_refresh_token",
-        token_expires_at=int(datetime.now(timezone.utc).timestamp() + 3600) # Example timestamp
     )
-    db_session.add(conn)
-    db_session.commit()
-    db_session.refresh(conn)
 
     # Assert that the tokens are encrypted (i.e., they are bytes and not the original string)
     assert isinstance(conn.access_token, bytes)
     assert isinstance(conn.refresh_token, bytes)
+    assert conn.access_token != b"test_access_token"
     assert conn.decrypt_access_token() == "test_access_token"
     assert conn.decrypt_refresh_token() == "test_refresh_token"
-    assert conn.broker_id == broker.id
-
-    # Restore the original encryption key
-    settings.encryption_key = original_encryption_key
-    db_session.add(conn)
-    db_session.commit()
-    assert conn.id is not None
-    assert conn.user.username == "brokeruser"
-    assert conn.broker.name == "TestBrokerConn" # Verify relationship
-
-def test_bot_instance_creation(db_session):
-    user = User(username="botuser", hashed_password="hp")
-    db_session.add(user)
-    db_session.commit()
-    db_session.refresh(user)
-
-    strategy = StrategyDefinition(name="TestStrategy", file_path="test.py", class_name="TestStrategyClass", created_by=user.id)
-    db_session.add(strategy)
-    db_session.commit()
-    db_session.refresh(strategy)
-
-    broker = Broker(name="TestBrokerBot", base_url="http://testbot.com", streaming_url="ws://testbot.com/stream", is_live_mode=False)
-    db_session.add(broker)
-    db_session.commit()
-    db_session.refresh(broker)
-
-    # Generate a valid Fernet key for testing
-    test_encryption_key = generate_key()
-    # Temporarily override the settings.encryption_key for this test
-    original_encryption_key = settings.encryption_key
-    settings.encryption_key = test_encryption_key
-
-    conn = BrokerageConnection(
-        user_id=user.id,
-        broker_id=broker.id, # New required argument
-        access_token="test_api_key_bot",
-        api_secret="test_api_secret_bot"
-    )
-    db_session.add(conn)
-    db_session.commit()
-    db_session.refresh(conn)
 
-    # Restore the original encryption key
-    settings.encryption_key = original_encryption_key
-    
-    bot = BotInstance(user_id=user.id, strategy_id=strategy.id, brokerage_connection_id=conn.id, name="MyBot", status="running")
+def test_bot_instance_creation(db_session, base_user, base_strategy, base_conn):
+    bot = BotInstance(user_id=base_user.id, strategy_id=base_strategy.id, brokerage_connection_id=base_conn.id, name="MyBot", status="running")
     db_session.add(bot)
     db_session.commit()
-    db_session.refresh(bot)
+
+    # Load the bot and every relationship under test in one joined SELECT instead of a lazy load per attribute
+    bot = db_session.execute(
+        select(BotInstance)
+        .options(
+            joinedload(BotInstance.user),
+            joinedload(BotInstance.strategy),
+            joinedload(BotInstance.brokerage_connection).joinedload(BrokerageConnection.broker),
+        )
+        .where(BotInstance.id == bot.id)
+    ).scalar_one()
     assert bot.id is not None
-    assert bot.user.username == "botuser"
-    assert bot.brokerage_connection.broker.name == "TestBrokerBot" # Verify relationship
-    assert bot.strategy.name == "TestStrategy"
+    assert bot.user.username == "graphuser"
+    assert bot.brokerage_connection.broker.name == "TestBrokerGraph" # Verify relationship
+    assert bot.strategy.name == "GraphStrategy"
 
 def test_strategy_definition_creation(db_session):
     user = User(username="strategyuser", hashed_password="hp")
     db_session.add(user)
-    db_session.commit()
-    db_session.refresh(user)
+    db_session.flush()
 
     strategy = StrategyDefinition(name="PMCC", file_path="pmcc.py", class_name="PMCCStrategy", created_by=user.id)
     db_session.add(strategy)
     db_session.commit()
-    db_session.refresh(strategy)
 
     assert strategy.id is not None
     assert strategy.name == "PMCC"
     assert strategy.created_user.username == "strategyuser"
 
+PMCC_PARAMETERS = [
+    ("delta_threshold", "0.7"),
+    ("days_to_expiration_long", "365"),
+    ("days_to_expiration_short", "30"),
+    ("profit_target_percentage", "0.1"),
+    ("stop_loss_percentage", "0.05"),
+]
+
 def test_strategy_parameters_pmcc_creation(db_session):
     user = User(username="pmccuser", hashed_password="hp")
     db_session.add(user)
-    db_session.commit()
-    db_session.refresh(user)
+    db_session.flush()
 
     strategy = StrategyDefinition(name="PMCC_Params", file_path="pmcc.py", class_name="PMCCStrategy", created_by=user.id)
     db_session.add(strategy)
-    db_session.commit()
-    db_session.refresh(strategy)
-
-    strategy_params = [
-        StrategyParameter(strategy_definition_id=strategy.id, name="delta_threshold", value="0.7"),
-        StrategyParameter(strategy_definition_id=strategy.id, name="days_to_expiration_long", value="365"),
-        StrategyParameter(strategy_definition_id=strategy.id, name="days_to_expiration_short", value="30"),
-        StrategyParameter(strategy_definition_id=strategy.id, name="profit_target_percentage", value="0.1"),
-        StrategyParameter(strategy_definition_id=strategy.id, name="stop_loss_percentage", value="0.05"),
-    ]
-    db_session.add_all(strategy_params)
-    db_session.commit()
-    for param in strategy_params:
-        db_session.refresh(param)
-
-    retrieved_params = db_session.query(StrategyParameter).filter_by(strategy_definition_id=strategy.id).all()
-    assert len(retrieved_params) == 5
-    param_names = {p.name for p in retrieved_params}
-    assert "delta_threshold" in param_names
-    assert "days_to_expiration_long" in param_names
-    assert "days_to_expiration_short" in param_names
-    assert "profit_target_percentage" in param_names
-    assert "stop_loss_percentage" in param_names
-    assert retrieved_params[0].id is not None
-    assert retrieved_params[0].strategy_definition.name == "PMCC_Params"
-
-def test_trade_order_creation(db_session):
-    user = User(username="orderuser", hashed_password="hp")
-    db_session.add(user)
-    db_session.commit()
-    db_session.refresh(user)
+    db_session.flush()
 
-    strategy = StrategyDefinition(name="OrderStrategy", file_path="order.py", class_name="OrderStrategyClass", created_by=user.id)
-    db_session.add(strategy)
-    db_session.commit()
-    db_session.refresh(strategy)
-
-    broker = Broker(name="TestBrokerOrder", base_url="http://testorder.com", streaming_url="ws://testorder.com/stream", is_live_mode=False)
-    db_session.add(broker)
-    db_session.commit()
-    db_session.refresh(broker)
-
-    # Generate a valid Fernet key for testing
-    test_encryption_key = generate_key()
-    # Temporarily override the settings.encryption_key for this test
-    original_encryption_key = settings.encryption_key
-    settings.encryption_key = test_encryption_key
-
-    conn = BrokerageConnection(
-        user_id=user.id,
-        broker_id=broker.id, # New required argument
-        access_token="test_api_key_order",
-        api_secret="test_api_secret_order"
-    )
-    db_session.add(conn)
-    db_session.commit()
-    db_session.refresh(conn)
-
-    # Restore the original encryption key
-    settings.encryption_key = original_encryption_key
-    
-    bot = BotInstance(user_id=user.id, strategy_id=strategy.id, brokerage_connection_id=conn.id, name="OrderBot", status="running")
-    db_session.add(bot)
+    # One executemany INSERT ... RETURNING compiled once, rather than an ORM INSERT per parameter
+    param_ids = db_session.scalars(
+        insert(StrategyParameter).returning(StrategyParameter.id),
+        [{"strategy_definition_id": strategy.id, "name": name, "value": value} for name, value in PMCC_PARAMETERS],
+    ).all()
     db_session.commit()
-    db_session.refresh(bot)
+    assert len(param_ids) == 5
+    assert None not in param_ids
 
-    order = TradeOrder(bot_instance_id=bot.id, symbol="SPY", order_type="market", quantity=10, status="pending")
-    db_session.add(order)
-    db_session.commit()
-    db_session.refresh(order)
-    assert order.id is not None
-    assert order.bot_instance.name == "OrderBot"
-
-def test_position_creation(db_session):
-    user = User(username="positionuser", hashed_password="hp")
-    db_session.add(user)
-    db_session.commit()
-    db_session.refresh(user)
-
-    strategy = StrategyDefinition(name="PositionStrategy", file_path="position.py", class_name="PositionStrategyClass", created_by=user.id)
-    db_session.add(strategy)
-    db_session.commit()
-    db_session.refresh(strategy)
-
-    broker = Broker(name="TestBrokerPosition", base_url="http://testposition.com", streaming_url="ws://testposition.com/stream", is_live_mode=False)
-    db_session.add(broker)
-    db_session.commit()
-    db_session.refresh(broker)
-
-    # Generate a valid Fernet key for testing
-    test_encryption_key = generate_key()
-    # Temporarily override the settings.encryption_key for this test
-    original_encryption_key = settings.encryption_key
-    settings.encryption_key = test_encryption_key
-
-    conn = BrokerageConnection(
-        user_id=user.id,
-        broker_id=broker.id, # New required argument
-        access_token="test_api_key_position",
-        api_secret="test_api_secret_position"
-    )
-    db_session.add(conn)
-    db_session.commit()
-    db_session.refresh(conn)
-
-    # Restore the original encryption key
-    settings.encryption_key = original_encryption_key
-    
-    bot = BotInstance(user_id=user.id, strategy_id=strategy.id, brokerage_connection_id=conn.id, name="PositionBot", status="running")
-    db_session.add(bot)
-    db_session.commit()
-    db_session.refresh(bot)
-
-    position = Position(bot_instance_id=bot.id, symbol="AAPL", quantity=5, average_cost=150.0)
-    db_session.add(position)
-    db_session.commit()
-    db_session.refresh(position)
-    assert position.id is not None
-    assert position.bot_instance.name == "PositionBot"
\ No newline at end of file
+    retrieved_params = db_session.query(StrategyParameter).filter_by(strategy_definition_id=strategy.id).all()
+    assert {p.id for p in retrieved_params} == set(param_ids)
+    assert {p.name for p in retrieved_params} == {name for name, _ in PMCC_PARAMETERS}
+    assert all(p.strategy_definition_id == strategy.id for p in retrieved_params)
+
+# Rows that hang off a bot: (model, constructor arguments besides bot_instance_id)
+BOT_CHILD_CASES = [
+    (TradeOrder, {"symbol": "SPY", "order_type": "market", "quantity": 10, "status": "pending"}),
+    (Position, {"symbol": "AAPL", "quantity": 5, "average_cost": 150.0}),
+]
+
+@pytest.mark.parametrize("model_cls,kwargs", BOT_CHILD_CASES, ids=["trade_order", "position"])
+def test_bot_child_creation(db_session, base_bot, model_cls, kwargs):
+    row = model_cls(bot_instance_id=base_bot.id, **kwargs)
+    db_session.add(row)
+    db_session.commit()
+    assert row.id is not None
+    assert row.bot_instance_id == base_bot.id # The FK link is what's under test; base_bot is already in memory
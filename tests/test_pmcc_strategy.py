@@ -1,22 +1,32 @@
+import copy
 import pytest
-from unittest.mock import Mock
-from src.strategies.pmcc import PMCCStrategy
+from unittest.mock import Mock, call
+from src.strategies.pmcc import PMCCStrategy, _expiration_ordinal
+from src.position_sizing.kelly import calculate_kelly_percentage, calculate_fractional_kelly, calculate_position_size
 from datetime import datetime, date, timedelta
 
-@pytest.fixture
-def mock_brokerage():
-    """Mock brokerage object for PMCCStrategy."""
-    mock = Mock()
+def _set_brokerage_defaults(mock):
     mock.place_order.return_value = {"status": "success", "order_id": "mock_order_123"}
+    mock.place_order.side_effect = None
     mock.cancel_order.return_value = True
     mock.get_current_price.return_value = 100.0 # Default mock for current price
     mock.get_quotes.return_value = {"greeks": {"delta": 0.30}} # Default mock for get_quotes
     mock.get_account_balance.return_value = {"equity": 100000.0} # Default mock for account balance
-    return mock
 
-@pytest.fixture
+@pytest.fixture(scope="module")
+def mock_brokerage():
+    """Mock brokerage object for PMCCStrategy, built once per module."""
+    return Mock()
+
+@pytest.fixture(autouse=True)
+def _reset_brokerage(mock_brokerage):
+    # Clear recorded calls and restore the default responses before each test
+    mock_brokerage.reset_mock()
+    _set_brokerage_defaults(mock_brokerage)
+
+@pytest.fixture(scope="module")
 def pmcc_parameters():
-    """Parameters for PMCCStrategy."""
+    """Parameters for PMCCStrategy. Shared by the module, so tests override values on a copy."""
     return {
         "name": "Test PMCC Strategy",
         "description": "A test strategy for PMCC.",
@@ -30,12 +40,25 @@ def pmcc_parameters():
         "max_net_debit": 1000.0
     }
 
-@pytest.fixture
-def mock_option_chain():
-    """Mock option chain data."""
+@pytest.fixture(scope="module")
+def strategy_factory(mock_brokerage, pmcc_parameters):
+    """Builds PMCCStrategy instances by copying the state of one strategy constructed per module."""
+    base = PMCCStrategy(mock_brokerage, **pmcc_parameters)
+
+    def make(**overrides):
+        strategy = copy.copy(base)
+        for name, value in overrides.items():
+            setattr(strategy, name, value)
+        return strategy
+    return make
+
+@pytest.fixture(scope="module")
+def option_chain_template():
+    """Mock option chain data, with the expiry dates formatted once per module."""
     today = date.today()
     long_expiry = (today + timedelta(days=200)).strftime('%Y-%m-%d')
     short_expiry = (today + timedelta(days=5)).strftime('%Y-%m-%d')
+    other_expiry = (today + timedelta(days=10)).strftime('%Y-%m-%d')
  
     return [
         # Long calls (ITM/ATM, long expiry, high delta) - Adjusted for positive net debit
@@ -62,13 +85,43 @@ def mock_option_chain():
             "greeks": {"delta": -0.5}, "bid": 2.0, "ask": 2.2, "type": "equity"
         },
         {
-            "symbol": "SPY", "optionType": "CALL", "strike": 100.0, "expirationDate": (today + timedelta(days=10)).strftime('%Y-%m-%d'),
+            "symbol": "SPY", "optionType": "CALL", "strike": 100.0, "expirationDate": other_expiry,
             "greeks": {"delta": 0.9}, "bid": 3.0, "ask": 3.2, "type": "equity"
         },
     ]
 
-def test_filter_otm_daily_calls(mock_brokerage, pmcc_parameters):
-    strategy = PMCCStrategy(mock_brokerage, **pmcc_parameters)
+@pytest.fixture
+def mock_option_chain(option_chain_template):
+    """A per-test copy of the option chain; the strategy may write fetched greeks into the dicts."""
+    return copy.deepcopy(option_chain_template)
+
+@pytest.fixture(scope="module")
+def expected_num_contracts_fixture():
+    """Contracts _identify_trade should size for the mock_option_chain trade, computed once per module."""
+    # This calculation needs to match the logic in _identify_trade
+    long_call_price_fixture = 10.0
+    short_call_price_fixture = 5.0
+    long_call_strike_fixture = 90.0
+    short_call_strike_fixture = 120.0
+    net_debit_fixture = (long_call_price_fixture - short_call_price_fixture) * 100 # 500.0
+    
+    max_profit_per_contract_fixture = (short_call_strike_fixture - long_call_strike_fixture) * 100 - net_debit_fixture # (120-90)*100 - 500 = 3000 - 500 = 2500
+    max_loss_per_contract_fixture = net_debit_fixture # 500.0
+    win_probability_fixture = 1 - 0.30 # 0.70 (assuming short call delta is 0.30)
+    payout_ratio_fixture = max_profit_per_contract_fixture / max_loss_per_contract_fixture # 2500 / 500 = 5.0
+    
+    full_kelly_percentage_fixture = calculate_kelly_percentage(win_probability_fixture, payout_ratio_fixture) # 0.64
+    fractional_kelly_percentage_fixture = calculate_fractional_kelly(full_kelly_percentage_fixture) # 0.64 * 0.618 = 0.39552
+    
+    # Assumes the default mock_brokerage.get_account_balance.return_value = {"equity": 100000.0}
+    return calculate_position_size(
+        total_capital=100000.0, # Use default mock equity
+        fractional_kelly_percentage=fractional_kelly_percentage_fixture,
+        contract_price=net_debit_fixture # Capital required per contract
+    ) # Should be 79
+
+def test_filter_otm_daily_calls(strategy_factory):
+    strategy = strategy_factory()
     
     today = date.today()
     # Options for testing OTM and daily expiry
@@ -102,20 +155,39 @@ def test_filter_otm_daily_calls(mock_brokerage, pmcc_parameters):
     assert filtered_calls[0]['strike'] == 105.0
     assert filtered_calls[0]['expirationDate'] == (today + timedelta(days=1)).strftime('%Y-%m-%d')
 
-def test_select_long_call(mock_brokerage, pmcc_parameters, mock_option_chain):
-    strategy = PMCCStrategy(mock_brokerage, **pmcc_parameters)
+@pytest.mark.parametrize("expiration_date", ["20240621", "2024-W25-5", "2024-06-21T00:00"])
+def test_expiration_ordinal_rejects_non_ymd(expiration_date):
+    # Only the YYYY-MM-DD shape the broker sends is accepted, as with the original strptime parsing
+    with pytest.raises(ValueError):
+        _expiration_ordinal(expiration_date)
+
+def test_select_long_call(strategy_factory, mock_option_chain):
+    strategy = strategy_factory()
     long_call = strategy._select_long_call(mock_option_chain)
     assert long_call is not None
     assert long_call['strike'] == 90.0 # Expect the highest delta ITM call
 
-def test_select_short_call(mock_brokerage, pmcc_parameters, mock_option_chain):
-    strategy = PMCCStrategy(mock_brokerage, **pmcc_parameters)
+def test_select_long_call_no_qualifying_calls(strategy_factory, mock_option_chain):
+    strategy = strategy_factory()
+    assert strategy._select_long_call([]) is None
+    # Only the short-dated calls and the put remain
+    assert strategy._select_long_call([o for o in mock_option_chain if o['strike'] not in (90.0, 95.0)]) is None
+
+def test_select_long_call_ties_keep_chain_order(strategy_factory, mock_option_chain):
+    strategy = strategy_factory()
+    # The ranking key ties for every qualifying call, so the first one in chain order wins, as with the previous stable sort
+    long_calls = [o for o in mock_option_chain if o['strike'] in (90.0, 95.0)]
+    assert strategy._select_long_call(long_calls)['strike'] == 90.0
+    assert strategy._select_long_call(long_calls[::-1])['strike'] == 95.0
+
+def test_select_short_call(strategy_factory, mock_option_chain):
+    strategy = strategy_factory()
     short_call = strategy._select_short_call(mock_option_chain)
     assert short_call is not None
     assert short_call['strike'] == 120.0 # Expect the OTM call with delta 0.30 and short expiry, now with strike 120.0
 
-def test_select_short_call_fetches_greeks_if_missing(mock_brokerage, pmcc_parameters):
-    strategy = PMCCStrategy(mock_brokerage, **pmcc_parameters)
+def test_select_short_call_fetches_greeks_if_missing(strategy_factory, mock_brokerage):
+    strategy = strategy_factory()
     
     today = date.today()
     short_expiry = (today + timedelta(days=5)).strftime('%Y-%m-%d')
@@ -143,9 +215,7 @@ def test_select_short_call_fetches_greeks_if_missing(mock_brokerage, pmcc_parame
 
 def test_select_short_call_closest_delta(mock_brokerage, pmcc_parameters):
     # Adjust parameters to have a specific target mid-delta
-    pmcc_parameters["min_delta_short"] = 0.2
-    pmcc_parameters["max_delta_short"] = 0.4
-    strategy = PMCCStrategy(mock_brokerage, **pmcc_parameters)
+    strategy = PMCCStrategy(mock_brokerage, **{**pmcc_parameters, "min_delta_short": 0.2, "max_delta_short": 0.4})
     
     today = date.today()
     short_expiry_same = (today + timedelta(days=5)).strftime('%Y-%m-%d')
@@ -175,8 +245,8 @@ def test_select_short_call_closest_delta(mock_brokerage, pmcc_parameters):
     assert short_call is not None
     assert short_call['strike'] == 107.0 # Expect the one with delta 0.30, as it's exactly in the middle (0.2+0.4)/2 = 0.3
 
-def test_identify_trade_valid(mock_brokerage, pmcc_parameters, mock_option_chain):
-    strategy = PMCCStrategy(mock_brokerage, **pmcc_parameters)
+def test_identify_trade_valid(strategy_factory, mock_option_chain):
+    strategy = strategy_factory()
     long_call = strategy._select_long_call(mock_option_chain)
     short_call = strategy._select_short_call(mock_option_chain)
     trade = strategy._identify_trade(long_call, short_call, current_price=100.0)
@@ -194,102 +264,55 @@ def test_identify_trade_valid(mock_brokerage, pmcc_parameters, mock_option_chain
     assert 'num_contracts' in trade # Ensure num_contracts is present
     assert trade['num_contracts'] > 0 # Ensure a positive number of contracts is calculated
 
-def test_identify_trade_invalid_short_strike_not_higher(mock_brokerage, pmcc_parameters):
-    strategy = PMCCStrategy(mock_brokerage, **pmcc_parameters)
-    today = date.today()
-    long_expiry = (today + timedelta(days=200)).strftime('%Y-%m-%d')
-    short_expiry = (today + timedelta(days=5)).strftime('%Y-%m-%d')
+_TODAY = date.today()
+_LONG_EXPIRY = (_TODAY + timedelta(days=200)).strftime('%Y-%m-%d')
+_SHORT_EXPIRY = (_TODAY + timedelta(days=5)).strftime('%Y-%m-%d')
 
-    long_call = {"symbol": "SPY", "optionType": "CALL", "strike": 90.0, "expirationDate": long_expiry, "greeks": {"delta": 0.85}, "bid": 10.0, "ask": 10.5}
-    # Short call strike is not higher than long call strike
-    short_call = {"symbol": "SPY", "optionType": "CALL", "strike": 90.0, "expirationDate": short_expiry, "greeks": {"delta": 0.30}, "bid": 1.0, "ask": 1.2}
-    trade = strategy._identify_trade(long_call, short_call, current_price=100.0)
-    assert trade is None
+def _call(strike, expiration_date, delta, bid, ask):
+    return {"symbol": "SPY", "optionType": "CALL", "strike": strike, "expirationDate": expiration_date, "greeks": {"delta": delta}, "bid": bid, "ask": ask}
 
-def test_identify_trade_invalid_short_expiry_not_earlier(mock_brokerage, pmcc_parameters):
-    strategy = PMCCStrategy(mock_brokerage, **pmcc_parameters)
-    today = date.today()
-    long_expiry = (today + timedelta(days=200)).strftime('%Y-%m-%d')
+INVALID_TRADE_CASES = [
+    # Short call strike is not higher than long call strike
+    (_call(90.0, _LONG_EXPIRY, 0.85, 10.0, 10.5), _call(90.0, _SHORT_EXPIRY, 0.30, 1.0, 1.2)),
     # Short call expiry is not earlier than long call expiry
-    short_expiry = (today + timedelta(days=200)).strftime('%Y-%m-%d')
-
-    long_call = {"symbol": "SPY", "optionType": "CALL", "strike": 90.0, "expirationDate": long_expiry, "greeks": {"delta": 0.85}, "bid": 10.0, "ask": 10.5}
-    short_call = {"symbol": "SPY", "optionType": "CALL", "strike": 105.0, "expirationDate": short_expiry, "greeks": {"delta": 0.30}, "bid": 1.0, "ask": 1.2}
-    trade = strategy._identify_trade(long_call, short_call, current_price=100.0)
-    assert trade is None
-
-def test_identify_trade_invalid_profitability(mock_brokerage, pmcc_parameters):
-    strategy = PMCCStrategy(mock_brokerage, **pmcc_parameters)
-    today = date.today()
-    long_expiry = (today + timedelta(days=200)).strftime('%Y-%m-%d')
-    short_expiry = (today + timedelta(days=5)).strftime('%Y-%m-%d')
-
+    (_call(90.0, _LONG_EXPIRY, 0.85, 10.0, 10.5), _call(105.0, _LONG_EXPIRY, 0.30, 1.0, 1.2)),
     # Make profitability check fail: (short_strike - long_strike) + short_premium <= long_premium
-    long_call = {"symbol": "SPY", "optionType": "CALL", "strike": 90.0, "expirationDate": long_expiry, "greeks": {"delta": 0.85}, "bid": 10.0, "ask": 10.5} # Cost of LEAPS = 10.5
-    short_call = {"symbol": "SPY", "optionType": "CALL", "strike": 95.0, "expirationDate": short_expiry, "greeks": {"delta": 0.30}, "bid": 0.01, "ask": 0.02} # Short premium = 0.01
-    # (95 - 90) + 0.01 = 5.01. This is not > 10.5, so it should fail.
+    # (95 - 90) + 0.01 = 5.01. This is not > 10.5 (cost of LEAPS), so it should fail.
+    (_call(90.0, _LONG_EXPIRY, 0.85, 10.0, 10.5), _call(95.0, _SHORT_EXPIRY, 0.30, 0.01, 0.02)),
+    # No long call
+    (None, _call(105.0, "2024-06-07", 0.30, 1.0, 1.2)),
+    # No short call
+    (_call(90.0, "2025-01-17", 0.85, 10.0, 10.5), None),
+]
+
+@pytest.mark.parametrize("long_call,short_call", INVALID_TRADE_CASES,
+                         ids=["short_strike_not_higher", "short_expiry_not_earlier", "profitability", "no_long_call", "no_short_call"])
+def test_identify_trade_invalid(strategy_factory, long_call, short_call):
+    strategy = strategy_factory()
     trade = strategy._identify_trade(long_call, short_call, current_price=100.0)
     assert trade is None
 
-def test_identify_trade_invalid_no_long_call(mock_brokerage, pmcc_parameters):
-    strategy = PMCCStrategy(mock_brokerage, **pmcc_parameters)
-    short_call = {"symbol": "SPY", "optionType": "CALL", "strike": 105.0, "expirationDate": "2024-06-07", "greeks": {"delta": 0.30}, "bid": 1.0, "ask": 1.2}
-    trade = strategy._identify_trade(None, short_call, current_price=100.0)
-    assert trade is None
-
-def test_identify_trade_invalid_no_short_call(mock_brokerage, pmcc_parameters):
-    strategy = PMCCStrategy(mock_brokerage, **pmcc_parameters)
-    long_call = {"symbol": "SPY", "optionType": "CALL", "strike": 90.0, "expirationDate": "2025-01-17", "greeks": {"delta": 0.85}, "bid": 10.0, "ask": 10.5}
-    trade = strategy._identify_trade(long_call, None, current_price=100.0)
-    assert trade is None
-
-def test_analyze_valid_trade(mock_brokerage, pmcc_parameters, mock_option_chain):
-    strategy = PMCCStrategy(mock_brokerage, **pmcc_parameters)
+def test_analyze_valid_trade(strategy_factory, mock_option_chain):
+    strategy = strategy_factory()
     data = {"option_chain": mock_option_chain, "current_price": 100.0}
     result = strategy.analyze(data)
     assert result is True
     assert strategy.current_trade is not None
 
-def test_analyze_no_trade(mock_brokerage, pmcc_parameters):
-    strategy = PMCCStrategy(mock_brokerage, **pmcc_parameters)
+def test_analyze_no_trade(strategy_factory):
+    strategy = strategy_factory()
     data = {"option_chain": [], "current_price": 100.0} # Empty option chain
     result = strategy.analyze(data)
     assert result is False
     assert strategy.current_trade is None
 
-def test_execute_trade_success(mock_brokerage, pmcc_parameters, mock_option_chain):
-    strategy = PMCCStrategy(mock_brokerage, **pmcc_parameters)
+def test_execute_trade_success(strategy_factory, mock_brokerage, mock_option_chain, expected_num_contracts_fixture):
+    strategy = strategy_factory()
     data = {"option_chain": mock_option_chain, "current_price": 100.0}
     strategy.analyze(data) # Identify a trade first
 
     result = strategy.execute()
     assert result['status'] == 'success'
-    from unittest.mock import call
-    # Calculate expected number of contracts based on the mock_option_chain fixture values
-    # This calculation needs to match the logic in _identify_trade
-    long_call_price_fixture = 10.0
-    short_call_price_fixture = 5.0
-    long_call_strike_fixture = 90.0
-    short_call_strike_fixture = 120.0
-    net_debit_fixture = (long_call_price_fixture - short_call_price_fixture) * 100 # 500.0
-    
-    max_profit_per_contract_fixture = (short_call_strike_fixture - long_call_strike_fixture) * 100 - net_debit_fixture # (120-90)*100 - 500 = 3000 - 500 = 2500
-    max_loss_per_contract_fixture = net_debit_fixture # 500.0
-    win_probability_fixture = 1 - 0.30 # 0.70 (assuming short call delta is 0.30)
-    payout_ratio_fixture = max_profit_per_contract_fixture / max_loss_per_contract_fixture # 2500 / 500 = 5.0
-    
-    from src.position_sizing.kelly import calculate_kelly_percentage, calculate_fractional_kelly, calculate_position_size
-    
-    full_kelly_percentage_fixture = calculate_kelly_percentage(win_probability_fixture, payout_ratio_fixture) # 0.64
-    fractional_kelly_percentage_fixture = calculate_fractional_kelly(full_kelly_percentage_fixture) # 0.64 * 0.618 = 0.39552
-    
-    # Assuming mock_brokerage.get_account_balance.return_value = {"equity": 100000.0} for this test
-    expected_num_contracts_fixture = calculate_position_size(
-        total_capital=100000.0, # Use default mock equity
-        fractional_kelly_percentage=fractional_kelly_percentage_fixture,
-        contract_price=net_debit_fixture # Capital required per contract
-    ) # Should be 79
- 
     expected_calls = [
         call({
             "symbol": "SPY",
@@ -306,17 +329,17 @@ def test_execute_trade_success(mock_brokerage, pmcc_parameters, mock_option_chai
             "option_symbol": mock_option_chain[2]['symbol']
         })
     ]
-    mock_brokerage.place_order.assert_has_calls(expected_calls)
+    assert mock_brokerage.place_order.call_args_list == expected_calls
 
-def test_execute_trade_no_identified_trade(mock_brokerage, pmcc_parameters):
-    strategy = PMCCStrategy(mock_brokerage, **pmcc_parameters)
+def test_execute_trade_no_identified_trade(strategy_factory, mock_brokerage):
+    strategy = strategy_factory()
     result = strategy.execute()
     assert result['status'] == 'failed'
     assert "No valid trade identified" in result['message']
     mock_brokerage.place_order.assert_not_called()
 
-def test_execute_trade_long_order_fails(mock_brokerage, pmcc_parameters, mock_option_chain):
-    strategy = PMCCStrategy(mock_brokerage, **pmcc_parameters)
+def test_execute_trade_long_order_fails(strategy_factory, mock_brokerage, mock_option_chain):
+    strategy = strategy_factory()
     data = {"option_chain": mock_option_chain, "current_price": 100.0}
     strategy.analyze(data)
 
@@ -330,8 +353,8 @@ def test_execute_trade_long_order_fails(mock_brokerage, pmcc_parameters, mock_op
     assert "Failed to place long call order" in result['message']
     mock_brokerage.cancel_order.assert_not_called() # No long order to cancel if it failed to place
 
-def test_execute_trade_short_order_fails(mock_brokerage, pmcc_parameters, mock_option_chain):
-    strategy = PMCCStrategy(mock_brokerage, **pmcc_parameters)
+def test_execute_trade_short_order_fails(strategy_factory, mock_brokerage, mock_option_chain):
+    strategy = strategy_factory()
     data = {"option_chain": mock_option_chain, "current_price": 100.0}
     strategy.analyze(data)
 
@@ -345,7 +368,7 @@ def test_execute_trade_short_order_fails(mock_brokerage, pmcc_parameters, mock_o
     assert "Failed to place short call order" in result['message']
     mock_brokerage.cancel_order.assert_called_once_with("mock_long_order_id") # Long order should be cancelled
 
-def test_pmcc_strategy_with_position_sizing(mock_brokerage, pmcc_parameters, mock_option_chain):
+def test_pmcc_strategy_with_position_sizing(strategy_factory, mock_brokerage, mock_option_chain):
     # Set a specific account balance for this test
     mock_brokerage.get_account_balance.return_value = {"equity": 10000.0}
     
@@ -405,7 +428,7 @@ def test_pmcc_strategy_with_position_sizing(mock_brokerage, pmcc_parameters, moc
     # (10000 * 0.64) / 500 = 6400 / 500 = 12.8 -> 12 (integer)
     expected_num_contracts = 7 # Corrected based on fractional Kelly calculation
 
-    strategy = PMCCStrategy(mock_brokerage, **pmcc_parameters)
+    strategy = strategy_factory()
     data = {"option_chain": mock_option_chain_adjusted, "current_price": 100.0}
     
     # Analyze and identify trade
@@ -418,7 +441,6 @@ def test_pmcc_strategy_with_position_sizing(mock_brokerage, pmcc_parameters, moc
     result_execute = strategy.execute()
     assert result_execute['status'] == 'success'
     
-    from unittest.mock import call
     expected_calls = [
         call({
             "symbol": "SPY",
@@ -435,4 +457,4 @@ def test_pmcc_strategy_with_position_sizing(mock_brokerage, pmcc_parameters, moc
             "option_symbol": mock_option_chain_adjusted[1]['symbol']
         })
     ]
-    mock_brokerage.place_order.assert_has_calls(expected_calls)
\ No newline at end of file
+    assert mock_brokerage.place_order.call_args_list == expected_calls
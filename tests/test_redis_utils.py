@@ -6,12 +6,31 @@ import redis.asyncio as redis
 from redis.exceptions import ConnectionError
 from src.utils.redis_utils import initialize_redis, close_redis_connection, add_jti_to_blacklist, is_jti_blacklisted, redis_client
 
+class FakeRedis:
+    """Minimal stand-in for the async Redis client exposing only the coroutines redis_utils uses."""
+
+    def __init__(self):
+        self.ping = AsyncMock()
+        self.close = AsyncMock()
+        self.setex = AsyncMock()
+        self.exists = AsyncMock()
+
+    def reset_mock(self):
+        for method in (self.ping, self.close, self.setex, self.exists):
+            method.reset_mock(return_value=True, side_effect=True)
+
+@pytest.fixture(scope="module")
+def fake_redis():
+    """A single FakeRedis shared by the module."""
+    return FakeRedis()
+
 @pytest.fixture(autouse=True)
-def mock_redis_client():
-    """Mocks the global redis_client and redis.from_url for each test."""
-    with patch('src.utils.redis_utils.redis_client', new_callable=AsyncMock) as mock_global_client, \
-         patch('src.utils.redis_utils.redis.from_url', return_value=mock_global_client) as mock_from_url:
-        yield mock_global_client
+def mock_redis_client(fake_redis):
+    """Points the global redis_client and redis.from_url at the shared FakeRedis, reset for each test."""
+    fake_redis.reset_mock()
+    with patch('src.utils.redis_utils.redis_client', fake_redis), \
+         patch('src.utils.redis_utils.redis.from_url', return_value=fake_redis):
+        yield fake_redis
 
 @pytest.mark.asyncio
 async def test_initialize_redis_success(mock_redis_client):
@@ -42,9 +61,11 @@ async def test_add_jti_to_blacklist_success(mock_redis_client):
     """Test adding a JTI to the blacklist successfully."""
     mock_redis_client.setex.return_value = True
     jti = "test_jti"
-    expires_at = datetime.now(timezone.utc) + timedelta(minutes=5)
-    await add_jti_to_blacklist(jti, expires_at)
-    mock_redis_client.setex.assert_called_once_with(f"blacklist:{jti}", int((expires_at - datetime.now(timezone.utc)).total_seconds()), "blacklisted")
+    now = datetime(2030, 1, 1, tzinfo=timezone.utc)
+    expires_at = now + timedelta(minutes=5)
+    with patch('src.utils.redis_utils._now', return_value=now):
+        await add_jti_to_blacklist(jti, expires_at)
+    mock_redis_client.setex.assert_called_once_with(f"blacklist:{jti}", 300, "blacklisted")
 
 @pytest.mark.asyncio
 async def test_add_jti_to_blacklist_already_expired(mock_redis_client):